@@ -2,6 +2,10 @@
 ASGI config for Journal project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Live department boards (server-sent events) should be served through it, e.g.
+``uvicorn Journal.asgi:application``: an idle stream is then an awaiting
+coroutine rather than an occupied worker thread. Run a single process: the
+event broker lives in process memory (see the accounts.E002 check).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -19,6 +19,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / '.env')
 
 GIGDATA_API_KEY = os.getenv('GIGDATA_API_KEY')
+GIGDATA_API_URL = os.getenv('GIGDATA_API_URL', 'https://api.gigdata.ru/api/v2/suggest/mkb')
+GIGDATA_TIMEOUT = (2, 5)  # подключение, чтение (секунды)
+GIGDATA_CACHE_SIZE = 2000
+GIGDATA_CACHE_TTL = 24 * 60 * 60
+
+# Локальный справочник МКБ-10, загружается командой load_mkb10
+MKB10_DATA_FILE = BASE_DIR / 'data' / 'mkb10.csv'
+MKB10_INDEX_CHECK_INTERVAL = 60
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -46,28 +54,91 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'accounts',
     'crispy_forms',
-    'crispy_bootstrap4'
+    'crispy_bootstrap4',
+    'rest_framework',
 ]
 
+# API только для чтения; интеграции входят по номеру сотрудника и паролю
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.BasicAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap4"
 CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# EmployeeNumberOrUsernameBackend наследует ModelBackend (права доступа) и уже
+# ищет по логину, поэтому повторный ModelBackend лишь удваивал бы работу при ошибке входа
 AUTHENTICATION_BACKENDS = [
     'accounts.backends.EmployeeNumberOrUsernameBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
+CACHES = {
+    # Локальный кэш процесса: фрагменты страниц
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'journal',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Версии фрагментов, общие для всех процессов; таблицу создаёт
+    # manage.py createcachetable
+    'fragment_versions': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'journal_fragment_versions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Сессии в кэше только при общем для всех процессов Redis: в LocMem выход из
+# системы в одном процессе не был бы виден другим. Без SESSION_REDIS_URL -
+# обычные сессии в БД. С Redis сессии читаются из кэша, django_session - только
+# при промахе; отметка активности пишется в БД не чаще раза в
+# SESSION_DB_WRITE_INTERVAL секунд
+if os.getenv('SESSION_REDIS_URL'):
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('SESSION_REDIS_URL'),
+    }
+    SESSION_ENGINE = 'accounts.sessions'
+    SESSION_CACHE_ALIAS = 'sessions'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+SESSION_ACTIVITY_RESOLUTION = 60
+SESSION_DB_WRITE_INTERVAL = 300
+SESSION_CLEANUP_BATCH_SIZE = 500
+
+# Число процессов веб-сервера (ту же переменную читает gunicorn). Брокер
+# событий табло отделений живёт в памяти процесса, поэтому больше одного
+# процесса запрещено проверкой accounts.E002
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Фрагменты главной страницы и списка пациентов отделения; сбрасываются сигналами,
+# таймаут ограничивает только устаревание возраста пациентов
+FRAGMENT_CACHE_TIMEOUT = 600
+
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Профилирование запросов (Server-Timing и журнал медленных запросов), по умолчанию выключено
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', '') == '1'
+REQUEST_PROFILING_SLOW_MS = int(os.getenv('REQUEST_PROFILING_SLOW_MS', '500'))
+REQUEST_PROFILING_SLOW_QUERIES = int(os.getenv('REQUEST_PROFILING_SLOW_QUERIES', '50'))
+
 MIDDLEWARE = [
+    'accounts.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.SessionActivityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,7 +147,10 @@ ROOT_URLCONF = 'Journal.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': (
+            'accounts.profiling.ProfilingDjangoTemplates' if REQUEST_PROFILING
+            else 'django.template.backends.django.DjangoTemplates'
+        ),
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,10 +168,28 @@ WSGI_APPLICATION = 'Journal.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Профиль SQLite для одновременной работы: WAL позволяет читать во время записи,
+# busy_timeout ждёт освобождения блокировки вместо ошибки "database is locked".
+# Применяется к каждому новому соединению, проверяется командой check --database default
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'busy_timeout': 5000,        # мс
+    'synchronous': 'normal',     # в режиме WAL надёжно и без fsync на каждую транзакцию
+    'mmap_size': 268435456,      # 256 МБ
+    'cache_size': -65536,        # отрицательное значение - в КиБ, т.е. 64 МБ
+    'temp_store': 'memory',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Запись сразу берёт блокировку, иначе повышение блокировки внутри
+            # транзакции завершается ошибкой, минуя busy_timeout
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -143,6 +235,46 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic добавляет к именам хеш содержимого и сохраняет сжатые .gz/.br копии
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'accounts.storage.CompressedManifestStaticFilesStorage'},
+}
+
+# Срок кэширования в браузере для файлов с хешем в имени (год)
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+# Готовые печатные истории болезни, ключ - ID поступления и версия содержимого
+CASE_HISTORY_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'case_history')
+
+REQUEST_PROFILING_LOG_FILE = os.path.join(BASE_DIR, 'logs', 'slow_requests.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': REQUEST_PROFILING_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,  # файл создаётся только при первой записи
+            'formatter': 'plain',
+        },
+    },
+    'loggers': {
+        'accounts.profiling': {
+            'handlers': ['slow_requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,5 +1,8 @@
+import re
+
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf.urls import handler404
 from accounts import views
 
@@ -8,4 +11,6 @@ handler404 = 'accounts.views.custom_404_view'
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('accounts.urls')),
+    # Статика из STATIC_ROOT с заранее сжатыми копиями и вечным кэшем для имён с хешем
+    re_path(rf"^{re.escape(settings.STATIC_URL.lstrip('/'))}(?P<path>.+)$", views.static_asset_view, name='static_asset'),
 ]
@@ -1,7 +1,13 @@
 from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Department, Patient, Admission, Hospital, HealthNote
+from django.core.exceptions import PermissionDenied
+from django.db.models import OuterRef, Subquery
+from django.template.response import TemplateResponse
+from django.urls import path
+from .importers import STAFF_COLUMNS, import_staff
+from .models import CustomUser, Department, Patient, Admission, Hospital, HealthNote, DepartmentCensus, Mkb10Code
+from .pagination import ApproximateCountPaginator
 
 
 @admin.register(HealthNote)
@@ -22,8 +28,10 @@ class HealthNoteAdmin(admin.ModelAdmin):
         'admission__patient__first_name',
         'admission__patient__middle_name'
     )
-    date_hierarchy = 'created_at'
     ordering = ('-created_at',)
+    list_select_related = ('admission__patient',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
@@ -103,12 +111,20 @@ class HospitalAdmin(admin.ModelAdmin):
     ordering = ('name',)
 
 
+@admin.register(Mkb10Code)
+class Mkb10CodeAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name')
+    search_fields = ('code', 'name')
+    ordering = ('code',)
+
+
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
     list_display = ('name', 'code', 'get_hospital')
     list_filter = ('hospital',)
     search_fields = ('name', 'code', 'hospital__name')
     ordering = ('hospital', 'name')
+    list_select_related = ('hospital',)
 
     def get_hospital(self, obj):
         return obj.hospital.name if obj.hospital else '-'
@@ -132,6 +148,14 @@ class PatientAdmin(admin.ModelAdmin):
     list_filter = ('gender', 'hospital')
     search_fields = ('last_name', 'first_name', 'middle_name', 'snils', 'hospital__name')
     ordering = ('hospital', 'last_name', 'first_name')
+    list_select_related = ('hospital',)
+
+    def get_queryset(self, request):
+        current = DepartmentCensus.objects.filter(patient=OuterRef('pk')).order_by('-admission_date')
+        return super().get_queryset(request).annotate(
+            current_department=Subquery(current.values('department__name')[:1]),
+            current_room=Subquery(current.values('room_number')[:1])
+        )
 
     def get_hospital(self, obj):
         return obj.hospital.name if obj.hospital else '-'
@@ -140,22 +164,22 @@ class PatientAdmin(admin.ModelAdmin):
     get_hospital.admin_order_field = 'hospital'
 
     def get_current_department(self, obj):
-        admission = obj.admissions.filter(discharge_date__isnull=True).first()
-        return admission.department.name if admission else '-'
+        return obj.current_department or '-'
 
     get_current_department.short_description = 'Отделение'
+    get_current_department.admin_order_field = 'current_department'
 
     def get_current_room(self, obj):
-        admission = obj.admissions.filter(discharge_date__isnull=True).first()
-        return admission.room_number if admission else '-'
+        return obj.current_room or '-'
 
     get_current_room.short_description = 'Палата'
+    get_current_room.admin_order_field = 'current_room'
 
     def get_status(self, obj):
-        admission = obj.admissions.filter(discharge_date__isnull=True).first()
-        return "В стационаре" if admission else "Выписан"
+        return "В стационаре" if obj.is_hospitalized else "Выписан"
 
     get_status.short_description = 'Статус'
+    get_status.admin_order_field = 'is_hospitalized'
 
 
 @admin.register(Admission)
@@ -173,6 +197,9 @@ class AdmissionAdmin(admin.ModelAdmin):
     list_filter = ('patient__hospital', 'severity', 'discharge_date')
     search_fields = ('patient__last_name', 'patient__first_name', 'diagnosis')
     ordering = ('-admission_date',)
+    list_select_related = ('patient__hospital', 'department')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
     def get_hospital(self, obj):
         return obj.patient.hospital.name if obj.patient and obj.patient.hospital else '-'
@@ -186,8 +213,13 @@ class AdmissionAdmin(admin.ModelAdmin):
     diagnosis_short.short_description = 'Диагноз'
 
 
+class StaffImportForm(forms.Form):
+    file = forms.FileField(label='CSV-файл')
+
+
 class CustomUserAdmin(UserAdmin):
     form = CustomUserDepartmentForm
+    change_list_template = 'admin/accounts/customuser/change_list.html'
     filter_horizontal = ('departments', 'groups', 'user_permissions')
 
     fieldsets = UserAdmin.fieldsets + (
@@ -224,6 +256,10 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('hospital', 'is_staff', 'is_superuser', 'groups')
     search_fields = ('full_name', 'employee_number', 'phone_number', 'hospital__name')
     ordering = ('hospital', 'full_name')
+    list_select_related = ('hospital',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('departments')
 
     def get_hospital(self, obj):
         return obj.hospital.name if obj.hospital else '-'
@@ -236,6 +272,33 @@ class CustomUserAdmin(UserAdmin):
 
     get_departments.short_description = 'Отделения'
 
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='accounts_customuser_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        report = None
+        if request.method == 'POST':
+            form = StaffImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                try:
+                    report = import_staff(form.cleaned_data['file'].read())
+                except UnicodeDecodeError:
+                    form.add_error('file', 'Не удалось прочитать файл: сохраните CSV в UTF-8 или Windows-1251')
+        else:
+            form = StaffImportForm()
+        return TemplateResponse(request, 'admin/accounts/customuser/import_staff.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Импорт сотрудников',
+            'form': form,
+            'columns': STAFF_COLUMNS,
+            'report': report,
+        })
+
 
 if admin.site.is_registered(CustomUser):
     admin.site.unregister(CustomUser)
@@ -0,0 +1,244 @@
+import hashlib
+
+from django.db.models import Prefetch
+from django.utils.cache import parse_etags, quote_etag
+from django.utils.functional import cached_property
+from rest_framework import viewsets
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from .ingest import IngestError, ingest_readings, parse_jsonl
+from .models import Admission, HealthNote, Patient
+from .pagination import paginate_keyset
+from .serializers import AdmissionSerializer, HealthNoteSerializer, PatientSerializer
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+
+class HospitalStaffPermission(BasePermission):
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and request.user.hospital_id)
+
+
+class KeysetPagination(BasePagination):
+    # Тот же курсор (field, pk), что и у списков на страницах: один запрос
+    # с LIMIT на страницу, стоимость не зависит от глубины
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            page_size = int(request.query_params.get('page_size', API_PAGE_SIZE))
+        except ValueError:
+            page_size = API_PAGE_SIZE
+        page_size = min(max(page_size, 1), API_MAX_PAGE_SIZE)
+        self.page = paginate_keyset(queryset, view.cursor_field, request.query_params.get('cursor'), page_size)
+        return self.page.items
+
+    def get_next_link(self):
+        if not self.page.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), 'cursor', self.page.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+def _row_state(instance, seen):
+    # Значения, загруженные из базы, вместе с select_related и prefetch_related
+    # объектами - ровно то, из чего будет построен ответ
+    seen.add(id(instance))
+    state = [(name, value) for name, value in sorted(instance.__dict__.items()) if not name.startswith('_')]
+    for name, related in sorted(instance._state.fields_cache.items()):
+        if related is not None and id(related) not in seen:
+            state.append((name, _row_state(related, seen)))
+    for name, items in sorted(getattr(instance, '_prefetched_objects_cache', {}).items()):
+        state.append((name, [_row_state(item, seen) for item in items if id(item) not in seen]))
+    return state
+
+
+def rows_etag(instances, *extra):
+    state = [_row_state(instance, set()) for instance in instances]
+    return hashlib.md5(repr((state, extra)).encode(), usedforsecurity=False).hexdigest()
+
+
+class HospitalReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
+    permission_classes = [HospitalStaffPermission]
+    pagination_class = KeysetPagination
+    cursor_field = 'id'
+    # Поле сериализатора -> колонки для only(); по умолчанию колонка с тем же именем
+    field_columns = {}
+    # Поле сериализатора -> связь для select_related / Prefetch для prefetch_related
+    field_select = {}
+    field_prefetch = {}
+
+    def scope_queryset(self, hospital):
+        raise NotImplementedError
+
+    @cached_property
+    def requested_fields(self):
+        allowed = self.get_serializer_class().Meta.fields
+        raw = self.request.query_params.get('fields')
+        if not raw:
+            return list(allowed)
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = sorted(set(fields) - set(allowed))
+        if unknown:
+            raise ValidationError({'fields': f'Неизвестные поля: {", ".join(unknown)}'})
+        return fields
+
+    def get_queryset(self):
+        # Число запросов на страницу фиксировано: основная выборка плюс по
+        # одному запросу на каждую запрошенную prefetch-связь
+        columns = {'id', self.cursor_field}
+        select, prefetch = set(), []
+        for name in self.requested_fields:
+            columns.update(self.field_columns.get(name, (name,)))
+            if name in self.field_select:
+                select.add(self.field_select[name])
+            if name in self.field_prefetch:
+                prefetch.append(self.field_prefetch[name])
+        queryset = self.scope_queryset(self.request.user.hospital).only(*sorted(columns))
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['fields'] = self.requested_fields
+        return super().get_serializer(*args, **kwargs)
+
+    def int_param(self, name):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        if not value.isdigit():
+            raise ValidationError({name: 'Ожидается целое число'})
+        return int(value)
+
+    def conditional_response(self, instances, render, *extra):
+        # ETag считается по загруженным строкам, до сериализации: при
+        # совпадении с If-None-Match сериализатор не запускается вовсе
+        etag = quote_etag(rows_etag(instances, self.requested_fields, *extra))
+        if_none_match = parse_etags(self.request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = Response(status=304)
+        else:
+            response = render()
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        instances = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.conditional_response(
+            instances,
+            lambda: self.get_paginated_response(self.get_serializer(instances, many=True).data),
+            self.paginator.page.next_cursor
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional_response([instance], lambda: Response(self.get_serializer(instance).data))
+
+
+class PatientViewSet(HospitalReadOnlyViewSet):
+    serializer_class = PatientSerializer
+    # Порядок реестра пациентов, его покрывает patient_registry_idx
+    cursor_field = 'last_admission_date'
+    field_columns = {'admissions': ()}
+    field_prefetch = {
+        'admissions': Prefetch(
+            'admissions',
+            queryset=Admission.objects.select_related('department').only(
+                'id', 'patient', 'admission_date', 'discharge_date', 'room_number', 'department__code'
+            )
+        ),
+    }
+
+    def scope_queryset(self, hospital):
+        return Patient.objects.filter(hospital=hospital)
+
+
+class AdmissionViewSet(HospitalReadOnlyViewSet):
+    serializer_class = AdmissionSerializer
+    cursor_field = 'admission_date'
+    field_columns = {
+        'patient_name': ('patient__last_name', 'patient__first_name', 'patient__middle_name'),
+        'department_code': ('department__code',),
+        'is_active': ('discharge_date',),
+    }
+    field_select = {'patient_name': 'patient', 'department_code': 'department'}
+
+    def scope_queryset(self, hospital):
+        return Admission.objects.filter(patient__hospital=hospital)
+
+    def filter_queryset(self, queryset):
+        patient = self.int_param('patient')
+        if patient is not None:
+            queryset = queryset.filter(patient_id=patient)
+        department = self.int_param('department')
+        if department is not None:
+            queryset = queryset.filter(department_id=department)
+        active = self.request.query_params.get('active')
+        if active in ('1', 'true'):
+            queryset = queryset.filter(discharge_date__isnull=True)
+        elif active in ('0', 'false'):
+            queryset = queryset.filter(discharge_date__isnull=False)
+        return queryset
+
+
+class HealthNoteViewSet(HospitalReadOnlyViewSet):
+    serializer_class = HealthNoteSerializer
+    cursor_field = 'created_at'
+
+    def scope_queryset(self, hospital):
+        return HealthNote.objects.filter(admission__patient__hospital=hospital)
+
+    def filter_queryset(self, queryset):
+        admission = self.int_param('admission')
+        if admission is not None:
+            queryset = queryset.filter(admission_id=admission)
+        elif self.action == 'list':
+            # Лента записей читается по индексу (admission, created_at), без него это обход всей таблицы
+            raise ValidationError({'admission': 'Обязательный параметр'})
+        note_type = self.request.query_params.get('note_type')
+        if note_type:
+            if note_type not in dict(HealthNote.NOTE_TYPE_CHOICES):
+                raise ValidationError({'note_type': f'Неизвестный тип записи: {note_type}'})
+            queryset = queryset.filter(note_type=note_type)
+        return queryset
+
+
+class JSONLinesParser(BaseParser):
+    # Тот же формат, что отдаёт выгрузка export?format=jsonl
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        try:
+            return parse_jsonl(stream)
+        except IngestError as exc:
+            raise ParseError(str(exc))
+
+
+class VitalsIngestView(APIView):
+    # Пакетный приём показаний прикроватных мониторов: массив JSON или JSON Lines
+    permission_classes = [HospitalStaffPermission]
+    parser_classes = [JSONParser, JSONLinesParser]
+
+    def post(self, request):
+        readings = request.data
+        if not isinstance(readings, list):
+            raise ValidationError({'readings': 'Ожидается массив показаний или JSON Lines'})
+        try:
+            result = ingest_readings(request.user.hospital, readings)
+        except IngestError as exc:
+            raise ValidationError({'readings': str(exc)})
+        return Response(result)
@@ -0,0 +1,58 @@
+from functools import lru_cache
+
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+
+BOOTSTRAP = 'vendor/bootstrap-4.6.0'
+JQUERY = 'vendor/jquery-3.5.1'
+FONTAWESOME = 'vendor/fontawesome-5.15.4'
+CHARTJS = 'vendor/chartjs-4.4.1'
+
+# Имя для шаблонов -> (путь в static/, закреплённый URL той же версии на CDN)
+VENDOR_ASSETS = {
+    'bootstrap.css': (
+        f'{BOOTSTRAP}/css/bootstrap.min.css',
+        'https://cdn.jsdelivr.net/npm/bootstrap@4.6.0/dist/css/bootstrap.min.css',
+    ),
+    'bootstrap.js': (
+        f'{BOOTSTRAP}/js/bootstrap.bundle.min.js',
+        'https://cdn.jsdelivr.net/npm/bootstrap@4.6.0/dist/js/bootstrap.bundle.min.js',
+    ),
+    'jquery.js': (
+        f'{JQUERY}/jquery.slim.min.js',
+        'https://code.jquery.com/jquery-3.5.1.slim.min.js',
+    ),
+    'fontawesome.css': (
+        f'{FONTAWESOME}/css/all.min.css',
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/css/all.min.css',
+    ),
+    'chart.js': (
+        f'{CHARTJS}/chart.umd.js',
+        'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js',
+    ),
+}
+
+# Шрифты, на которые ссылается all.min.css (../webfonts/...)
+FONTAWESOME_WEBFONTS = {
+    f'{FONTAWESOME}/webfonts/{name}.{ext}':
+        f'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/webfonts/{name}.{ext}'
+    for name in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900')
+    for ext in ('eot', 'svg', 'ttf', 'woff', 'woff2')
+}
+
+# Все файлы, которые скачивает fetch_vendor_assets: путь в static/ -> URL
+VENDOR_FILES = {path: url for path, url in VENDOR_ASSETS.values()}
+VENDOR_FILES.update(FONTAWESOME_WEBFONTS)
+VENDOR_LOCK_FILE = 'vendor/vendor-lock.json'
+
+
+@lru_cache(maxsize=None)
+def is_vendored(path):
+    return finders.find(path) is not None
+
+
+def vendor_asset_url(name):
+    # Пока файлы не скачаны командой fetch_vendor_assets, отдаём ту же
+    # закреплённую версию с CDN, чтобы страницы не остались без стилей
+    path, cdn_url = VENDOR_ASSETS[name]
+    return static(path) if is_vendored(path) else cdn_url
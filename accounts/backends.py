@@ -1,18 +1,37 @@
 from django.contrib.auth import backends
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 
 
 class EmployeeNumberOrUsernameBackend(backends.ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         UserModel = get_user_model()
-        try:
-            user = UserModel.objects.get(employee_number=username)
-        except UserModel.DoesNotExist:
-            try:
-                user = UserModel.objects.get(username=username)
-            except UserModel.DoesNotExist:
-                return None
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        # Один запрос по двум уникальным индексам вместо двух get() подряд,
+        # совпадение по номеру сотрудника приоритетнее совпадения по логину
+        users = list(
+            UserModel._default_manager.filter(Q(employee_number=username) | Q(username=username)).order_by()[:2]
+        )
+        user = next((u for u in users if u.employee_number == username), users[0] if users else None)
+
+        if user is None:
+            # Хешируем пароль и для несуществующего пользователя, чтобы время
+            # ответа не выдавало, есть ли такой сотрудник
+            UserModel().set_password(password)
+            return None
 
-        if user.check_password(password):
+        if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('hospital').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
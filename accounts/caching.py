@@ -0,0 +1,49 @@
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+# Версии фрагментов: ключ закэшированного фрагмента включает версию области
+# (больница или отделение), а сигналы меняют её, поэтому старые фрагменты
+# просто перестают читаться и вытесняются по таймауту.
+#
+# Сами фрагменты лежат в LocMem каждого процесса, а версии - в общем для всех
+# процессов кэше 'fragment_versions' (таблица в БД): изменение в любом
+# воркере или management-команде сразу делает фрагменты устаревшими везде.
+def fragment_version_key(scope, pk):
+    return f'accounts:{scope}:{pk}:fragment_version'
+
+
+def get_fragment_versions(scope, *pks):
+    versions_cache = caches['fragment_versions']
+    keys = {fragment_version_key(scope, pk): pk for pk in pks}
+    found = versions_cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, pk in keys.items():
+        if key not in found:
+            # Начальное значение от часов, а не 1: после вытеснения ключа версия
+            # не повторит ту, под которой уже лежат устаревшие фрагменты
+            initial = time.time_ns()
+            versions_cache.add(key, initial, None)
+            versions[pk] = versions_cache.get(key, initial)
+    return versions
+
+
+def get_fragment_version(scope, pk):
+    return get_fragment_versions(scope, pk)[pk]
+
+
+def _bump_fragment_versions(scope, pks):
+    # Новая версия - метка времени, а не incr: запись без чтения, и два
+    # одновременных изменения не дадут одно и то же значение
+    caches['fragment_versions'].set_many(
+        {fragment_version_key(scope, pk): time.time_ns() for pk in pks}, None
+    )
+
+
+def bump_fragment_version(scope, *pks):
+    # Только после коммита: иначе параллельный запрос успеет закэшировать
+    # фрагмент из ещё не закоммиченных данных под уже новой версией
+    pks = set(pks)
+    if pks:
+        transaction.on_commit(lambda: _bump_fragment_versions(scope, pks))
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Admission
+
+
+def cache_dir(admission_id):
+    return Path(settings.CASE_HISTORY_CACHE_DIR) / str(admission_id)
+
+
+def cache_path(admission_id, version):
+    return cache_dir(admission_id) / f'v{version}.html'
+
+
+def render_case_history(admission_id):
+    admission = Admission.objects.select_related('patient__hospital', 'department').get(pk=admission_id)
+    notes = admission.entry_notes.order_by('created_at', 'id')
+    return render_to_string('accounts/case_history.html', {
+        'admission': admission,
+        'patient': admission.patient,
+        'notes': notes,
+        'generated_at': timezone.now(),
+    })
+
+
+def _store(admission_id, version, content):
+    directory = cache_dir(admission_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Пишем во временный файл и атомарно переименовываем, чтобы параллельный
+    # запрос никогда не прочитал недописанный документ
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_name, cache_path(admission_id, version))
+
+    for old in directory.glob('v*.html'):
+        if old.name != f'v{version}.html':
+            old.unlink(missing_ok=True)
+
+
+def get_case_history(admission_id, version):
+    # Версия читается до рендера: изменение во время рендера увеличит её,
+    # и следующий запрос построит документ заново
+    path = cache_path(admission_id, version)
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        pass
+    content = render_case_history(admission_id).encode('utf-8')
+    _store(admission_id, version, content)
+    return content
@@ -0,0 +1,54 @@
+from django.db import transaction
+
+from .caching import bump_fragment_version
+from .models import Admission, Department, DepartmentCensus
+
+CENSUS_FIELDS = ('department_id', 'patient_id', 'room_number', 'admission_date')
+
+
+def build_census_entry(admission):
+    return DepartmentCensus(
+        admission_id=admission.pk,
+        department_id=admission.department_id,
+        patient_id=admission.patient_id,
+        room_number=admission.room_number,
+        admission_date=admission.admission_date,
+    )
+
+
+def sync_admission(admission):
+    if admission.discharge_date is None:
+        DepartmentCensus.objects.update_or_create(
+            admission_id=admission.pk,
+            defaults={field: getattr(admission, field) for field in CENSUS_FIELDS}
+        )
+    else:
+        DepartmentCensus.objects.filter(admission_id=admission.pk).delete()
+
+
+def find_census_errors():
+    expected = {
+        row[0]: row[1:]
+        for row in Admission.objects.filter(discharge_date__isnull=True).values_list('id', *CENSUS_FIELDS)
+    }
+    actual = {
+        row[0]: row[1:]
+        for row in DepartmentCensus.objects.values_list('admission_id', *CENSUS_FIELDS)
+    }
+    return {
+        'missing': sorted(expected.keys() - actual.keys()),
+        'stale': sorted(actual.keys() - expected.keys()),
+        'mismatched': sorted(pk for pk in expected.keys() & actual.keys() if expected[pk] != actual[pk]),
+    }
+
+
+def rebuild_census(batch_size=2000):
+    with transaction.atomic():
+        DepartmentCensus.objects.all().delete()
+        admissions = Admission.objects.filter(discharge_date__isnull=True).only('id', *CENSUS_FIELDS)
+        DepartmentCensus.objects.bulk_create(
+            (build_census_entry(admission) for admission in admissions.iterator(chunk_size=batch_size)),
+            batch_size=batch_size
+        )
+    bump_fragment_version('department', *Department.objects.values_list('id', flat=True))
+    return DepartmentCensus.objects.count()
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections
+
+from .assets import VENDOR_FILES, is_vendored
+
+# PRAGMA возвращает числовые коды для этих значений
+PRAGMA_CODES = {
+    'synchronous': {'off': 0, 'normal': 1, 'full': 2, 'extra': 3},
+    'temp_store': {'default': 0, 'file': 1, 'memory': 2},
+}
+
+
+def expected_pragma(name, value):
+    value = str(value).lower()
+    return str(PRAGMA_CODES.get(name, {}).get(value, value))
+
+
+def sqlite_pragma_mismatches(connection, pragmas=None):
+    pragmas = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+    mismatches = []
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            # База в памяти (тесты) не поддерживает WAL и mmap
+            if row is None or (name == 'journal_mode' and row[0] == 'memory'):
+                continue
+            actual = str(row[0]).lower()
+            if actual != expected_pragma(name, value):
+                mismatches.append((name, expected_pragma(name, value), actual))
+    return mismatches
+
+
+# Без тега database: проверка идёт при каждом запуске (runserver, команды),
+# а не только в check --database и migrate. Соединение SQLite - локальный файл,
+# открыть его при старте дёшево
+@register()
+def check_sqlite_pragmas(app_configs=None, databases=None, **kwargs):
+    errors = []
+    for alias in connections if databases is None else databases:
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            continue
+        for name, expected, actual in sqlite_pragma_mismatches(connection):
+            errors.append(Error(
+                f'PRAGMA {name} для базы {alias!r} равна {actual}, ожидалось {expected}',
+                hint='Проверьте DATABASES[...]["OPTIONS"]["init_command"] и SQLITE_PRAGMAS',
+                id='accounts.E001',
+            ))
+    return errors
+
+
+@register()
+def check_single_process_events(app_configs=None, **kwargs):
+    # События табло публикуются в памяти процесса: подписчики другого воркера
+    # их не получат, а номера событий у каждого процесса свои
+    if settings.WEB_CONCURRENCY <= 1:
+        return []
+    return [Error(
+        f'WEB_CONCURRENCY={settings.WEB_CONCURRENCY}: брокер событий отделений работает только в одном процессе',
+        hint='Запускайте веб-сервер одним процессом (uvicorn Journal.asgi:application) и WEB_CONCURRENCY=1',
+        id='accounts.E002',
+    )]
+
+
+@register(Tags.staticfiles)
+def check_vendor_assets(app_configs=None, **kwargs):
+    # Без скачанных файлов страницы молча берут библиотеки с публичных CDN
+    missing = sorted(path for path in VENDOR_FILES if not is_vendored(path))
+    if not missing:
+        return []
+    return [Warning(
+        f'Не скачаны сторонние файлы ({len(missing)} из {len(VENDOR_FILES)}), например {missing[0]}; '
+        'страницы загружают их с публичных CDN',
+        hint='Выполните manage.py fetch_vendor_assets и добавьте файлы в static/vendor',
+        id='accounts.W001',
+    )]
@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import json
+import secrets
+import threading
+from collections import defaultdict, deque
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DepartmentCensus
+from .templatetags.custom_filters import age_in_years
+
+# Очередь одного подписчика; отстающий клиент получает reload вместо бесконечного буфера
+SUBSCRIBER_QUEUE_SIZE = 256
+# Сколько последних событий отделения хранится для догона по Last-Event-ID
+REPLAY_BUFFER_SIZE = 200
+# Комментарий-пинг, чтобы прокси не закрывали простаивающее соединение
+KEEPALIVE_SECONDS = 15
+RETRY_MS = 3000
+
+
+class Subscription:
+    def __init__(self, department_id, loop):
+        self.department_id = department_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Выполняется в цикле событий подписчика
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class DepartmentBroker:
+    # Брокер в памяти процесса: публикация идёт из синхронных потоков,
+    # подписчики живут в цикле событий ASGI. События одного процесса не видны
+    # другим, поэтому веб-сервер должен работать одним процессом (accounts.E002).
+    # id события - «эпоха-номер»: id чужой эпохи (другой процесс или
+    # перезапуск) не сравнивается с местными, клиент догоняет состояние по БД
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.epoch = secrets.token_hex(4)
+        self._ids = itertools.count(1)
+        self._subscribers = defaultdict(set)
+        self._history = defaultdict(lambda: deque(maxlen=REPLAY_BUFFER_SIZE))
+        # Номер последнего вытесненного из буфера события отделения
+        self._evicted = {}
+
+    def event_id(self, sequence):
+        return f'{self.epoch}-{sequence}'
+
+    def sequence(self, event_id):
+        # Номер события этого процесса или None для чужого и неверного id
+        epoch, _, sequence = (event_id or '').partition('-')
+        return int(sequence) if epoch == self.epoch and sequence.isdigit() else None
+
+    def subscribe(self, department_id, last_event_id=None):
+        # Возвращает подписку и пропущенные события; None вместо списка -
+        # пропущенного в буфере нет (вытеснено или id чужой эпохи) и клиенту
+        # нужен снимок отделения из БД
+        subscription = Subscription(department_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[department_id].add(subscription)
+            history = list(self._history.get(department_id, ()))
+            evicted = self._evicted.get(department_id, 0)
+        if last_event_id is None:
+            return subscription, []
+        sequence = self.sequence(last_event_id)
+        if sequence is None or sequence < evicted:
+            return subscription, None
+        return subscription, [event for event in history if event['sequence'] > sequence]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.department_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.department_id]
+
+    def last_event_id(self, department_id):
+        with self._lock:
+            history = self._history.get(department_id)
+            return history[-1]['id'] if history else self.event_id(self._evicted.get(department_id, 0))
+
+    def subscriber_count(self, department_id):
+        with self._lock:
+            return len(self._subscribers.get(department_id, ()))
+
+    def publish(self, department_id, event_type, data):
+        with self._lock:
+            sequence = next(self._ids)
+            event = {'id': self.event_id(sequence), 'sequence': sequence, 'type': event_type, 'data': data}
+            history = self._history[department_id]
+            if len(history) == history.maxlen:
+                self._evicted[department_id] = history[0]['sequence']
+            history.append(event)
+            subscribers = list(self._subscribers.get(department_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Цикл уже закрыт, подписка отпадёт сама
+                pass
+        return event
+
+
+broker = DepartmentBroker()
+
+
+def format_event(event):
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+def census_snapshot(department_id):
+    census = DepartmentCensus.objects.filter(department_id=department_id).select_related('patient')
+    return [_row_data(entry.admission_id, entry.patient, entry.room_number) for entry in census]
+
+
+async def snapshot_event(department_id):
+    # id берётся до чтения БД: всё, что опубликовано позже, клиент получит
+    # следующими событиями, а их повторное применение к снимку безвредно
+    event_id = broker.last_event_id(department_id)
+    rows = await sync_to_async(census_snapshot)(department_id)
+    return format_event({'id': event_id, 'type': 'snapshot', 'data': rows})
+
+
+async def department_stream(department_id, last_event_id=None, follow=True):
+    # Ожидание событий - это await на очереди, а не занятый поток, поэтому
+    # простаивающие табло под ASGI ничего не стоят. follow=False отдаёт
+    # только пропущенное и закрывает поток (WSGI): EventSource переподключится
+    # через RETRY_MS с Last-Event-ID
+    subscription, missed = broker.subscribe(department_id, last_event_id)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        if missed is None:
+            yield await snapshot_event(department_id)
+            missed = []
+        for event in missed:
+            yield format_event(event)
+        while follow:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                # Клиент отстал и события отброшены: снимок из БД вместо них
+                subscription.overflowed = False
+                yield await snapshot_event(department_id)
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def publish_on_commit(department_id, event_type, data):
+    # Клиенты видят только закоммиченные изменения; при откате событие не уходит
+    transaction.on_commit(lambda: broker.publish(department_id, event_type, data))
+
+
+def _row_data(admission_id, patient, room_number):
+    return {
+        'admission_id': admission_id,
+        'patient_id': patient.pk,
+        'url': reverse('patient_detail', args=[patient.pk]),
+        'name': f'{patient.last_name} {patient.first_name} {patient.middle_name}',
+        'snils': patient.formatted_snils(),
+        'age': age_in_years(patient.birth_date),
+        'room_number': room_number,
+    }
+
+
+def admission_event_data(admission):
+    return _row_data(admission.pk, admission.patient, admission.room_number)
+
+
+def vitals_event_data(note):
+    return {
+        'admission_id': note.admission_id,
+        'created_at': timezone.localtime(note.created_at).strftime('%d.%m.%Y %H:%M'),
+        'hr_value': note.hr_value,
+        'systolic_value': note.systolic_value,
+        'diastolic_value': note.diastolic_value,
+        'temperature_value': note.temperature_value,
+    }
+
+
+def has_vitals(note):
+    return any(
+        value is not None
+        for value in (note.hr_value, note.systolic_value, note.diastolic_value, note.temperature_value)
+    )
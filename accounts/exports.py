@@ -0,0 +1,141 @@
+import csv
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Admission, HealthNote
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (имя колонки в выгрузке, поле queryset.values_list)
+ADMISSION_COLUMNS = (
+    ('id', 'id'),
+    ('patient_id', 'patient_id'),
+    ('last_name', 'patient__last_name'),
+    ('first_name', 'patient__first_name'),
+    ('middle_name', 'patient__middle_name'),
+    ('birth_date', 'patient__birth_date'),
+    ('gender', 'patient__gender'),
+    ('department', 'department__code'),
+    ('room_number', 'room_number'),
+    ('admission_date', 'admission_date'),
+    ('discharge_date', 'discharge_date'),
+    ('severity', 'severity'),
+    ('diagnosis', 'diagnosis'),
+)
+
+NOTE_COLUMNS = (
+    ('id', 'id'),
+    ('admission_id', 'admission_id'),
+    ('patient_id', 'admission__patient_id'),
+    ('department', 'admission__department__code'),
+    ('note_type', 'note_type'),
+    ('created_at', 'created_at'),
+    ('hr_value', 'hr_value'),
+    ('temperature_value', 'temperature_value'),
+    ('systolic_value', 'systolic_value'),
+    ('diastolic_value', 'diastolic_value'),
+    ('text', 'text'),
+)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+def parse_filters(date_from=None, date_to=None, department=None, note_type=None):
+    filters = {}
+    for key, value in (('date_from', date_from), ('date_to', date_to)):
+        if value:
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                # Верный формат, но несуществующая дата (например, 30 февраля)
+                parsed = None
+            if parsed is None:
+                raise ExportFilterError(f'Неверная дата: {value}')
+            if key == 'date_to':
+                parsed += timedelta(days=1)
+            filters[key] = timezone.make_aware(datetime.combine(parsed, dt_time.min))
+    if department:
+        filters['department'] = department
+    if note_type:
+        if note_type not in dict(HealthNote.NOTE_TYPE_CHOICES):
+            raise ExportFilterError(f'Неизвестный тип записи: {note_type}')
+        filters['note_type'] = note_type
+    return filters
+
+
+def _department_lookup(prefix, department):
+    key = f'{prefix}department_id' if str(department).isdigit() else f'{prefix}department__code'
+    return {key: department}
+
+
+def admission_rows(hospital, filters):
+    admissions = Admission.objects.filter(patient__hospital=hospital)
+    if 'date_from' in filters:
+        admissions = admissions.filter(admission_date__gte=filters['date_from'])
+    if 'date_to' in filters:
+        admissions = admissions.filter(admission_date__lt=filters['date_to'])
+    if 'department' in filters:
+        admissions = admissions.filter(**_department_lookup('', filters['department']))
+    fields = [field for _, field in ADMISSION_COLUMNS]
+    return admissions.order_by('admission_date', 'id').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def note_rows(hospital, filters):
+    notes = HealthNote.objects.filter(admission__patient__hospital=hospital)
+    if 'date_from' in filters:
+        notes = notes.filter(created_at__gte=filters['date_from'])
+    if 'date_to' in filters:
+        notes = notes.filter(created_at__lt=filters['date_to'])
+    if 'department' in filters:
+        notes = notes.filter(**_department_lookup('admission__', filters['department']))
+    if 'note_type' in filters:
+        notes = notes.filter(note_type=filters['note_type'])
+    fields = [field for _, field in NOTE_COLUMNS]
+    return notes.order_by('created_at', 'id').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+DATASETS = {
+    'admissions': (ADMISSION_COLUMNS, admission_rows),
+    'notes': (NOTE_COLUMNS, note_rows),
+}
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def render_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def render_jsonl(columns, rows):
+    names = [name for name, _ in columns]
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def export(dataset, hospital, export_format, filters):
+    columns, rows = DATASETS[dataset]
+    render = render_csv if export_format == 'csv' else render_jsonl
+    return render(columns, rows(hospital, filters))
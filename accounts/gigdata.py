@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class GigdataError(Exception):
+    pass
+
+
+class CircuitOpenError(GigdataError):
+    pass
+
+
+def normalize_query(query):
+    return ' '.join((query or '').casefold().replace('ё', 'е').split())
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GigdataClient:
+    # Прокси к api.gigdata.ru: общий пул соединений, жёсткие таймауты,
+    # LRU-кэш с TTL, объединение одновременных одинаковых запросов и
+    # автомат отключения, отдающий устаревший кэш, пока сервис недоступен.
+
+    def __init__(self, api_key, url, timeout=(2, 5), retries=1, pool_size=10,
+                 cache_size=1000, cache_ttl=3600, failure_threshold=5, reset_timeout=30):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({'Authorization': api_key or '', 'Accept': 'application/json'})
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.2,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({'POST'}),
+                raise_on_status=False
+            )
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def _cache_get(self, key):
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None, False
+            self._cache.move_to_end(key)
+            expires_at, data = item
+            return data, expires_at > time.monotonic()
+
+    def _cache_set(self, key, data):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, data)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _circuit_open(self):
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # полуоткрытое состояние: пропускаем один пробный запрос, для
+                # остальных автомат разомкнут, пока проба не завершится
+                self._probing = True
+                return False
+            return True
+
+    def _record(self, success):
+        with self._lock:
+            self._probing = False
+            if success:
+                self._failures = 0
+                self._opened_at = None
+            else:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+
+    def _fetch(self, query):
+        try:
+            response = self.session.post(self.url, json={'query': query, 'count': 100}, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self._record(success=False)
+            raise GigdataError(str(e)) from e
+        self._record(success=True)
+        return data
+
+    def suggest(self, query):
+        # Нормализованная строка - только ключ кэша, в сервис уходит запрос как есть
+        key = normalize_query(query)
+        cached, fresh = self._cache_get(key)
+        if fresh:
+            return cached
+
+        if self._circuit_open():
+            if cached is not None:
+                return cached
+            raise CircuitOpenError('Сервис МКБ-10 временно недоступен')
+
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            call.done.wait(sum(self.timeout) * 2)
+            if call.result is not None:
+                return call.result
+            if cached is not None:
+                return cached
+            raise call.error or GigdataError('Превышено время ожидания ответа')
+
+        try:
+            call.result = self._fetch(query)
+            self._cache_set(key, call.result)
+            return call.result
+        except GigdataError as e:
+            call.error = e
+            if cached is not None:
+                return cached
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GigdataClient(
+                api_key=settings.GIGDATA_API_KEY,
+                url=settings.GIGDATA_API_URL,
+                timeout=settings.GIGDATA_TIMEOUT,
+                cache_size=settings.GIGDATA_CACHE_SIZE,
+                cache_ttl=settings.GIGDATA_CACHE_TTL,
+            )
+        return _client
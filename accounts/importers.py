@@ -0,0 +1,330 @@
+import csv
+import io
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_fragment_version
+from .census import build_census_entry
+from .models import (
+    Admission, CustomUser, Department, DepartmentCensus, Hospital, Patient, PatientSearchIndex,
+    build_base_username, pick_unique_username
+)
+from .search import build_search_entry
+
+STAFF_COLUMNS = ('full_name', 'position', 'employee_number', 'phone_number', 'hospital', 'departments', 'password')
+DEPARTMENT_SPLIT_RE = re.compile(r'[\s,;|]+')
+
+PATIENT_COLUMNS = (
+    'last_name', 'first_name', 'middle_name', 'birth_date', 'birth_place', 'snils', 'gender', 'height', 'weight',
+    'department', 'room_number', 'diagnosis', 'admission_date'
+)
+GENDERS = {'m': 'M', 'м': 'M', 'f': 'F', 'ж': 'F'}
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y')
+DATETIME_FORMATS = ('%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M', '%d.%m.%Y %H:%M') + DATE_FORMATS
+# Всё, кроме цифр, включая неразрывные пробелы и тире из Excel
+NON_DIGITS_RE = re.compile(r'\D')
+# Допустимые рост (см) и вес (кг); значение вне PositiveSmallIntegerField
+# нарушило бы CHECK в базе и откатило бы всю пачку
+HEIGHT_RANGE = (1, 300)
+WEIGHT_RANGE = (1, 700)
+# Сколько отклонённых строк хранится для вывода; остальные только считаются
+MAX_REJECTED = 1000
+
+
+class ImportReport:
+    def __init__(self, max_rejected=MAX_REJECTED):
+        self.created = 0
+        self.rejected = []
+        self.rejected_count = 0
+        self.max_rejected = max_rejected
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def reject(self, line, reason):
+        self.rejected_count += 1
+        if len(self.rejected) < self.max_rejected:
+            self.rejected.append((line, reason))
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        total = self.created + self.rejected_count
+        return round(total / self.seconds, 1) if self.seconds else 0.0
+
+
+def decode_csv(data):
+    # Excel в русской локали по умолчанию сохраняет CSV в cp1251
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('cp1251')
+
+
+def read_csv(file):
+    if isinstance(file, (bytes, bytearray)):
+        file = io.StringIO(decode_csv(file))
+    sample = file.read(4096)
+    file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+    except csv.Error:
+        dialect = csv.excel
+    return csv.DictReader(file, dialect=dialect)
+
+
+def _validate_field(field_name, value):
+    field = CustomUser._meta.get_field(field_name)
+    for validator in field.validators:
+        validator(value)
+
+
+def import_staff(file, hash_workers=4, batch_size=500):
+    report = ImportReport()
+    rows = list(enumerate(read_csv(file), start=2))
+
+    # Справочники загружаются один раз на весь файл
+    hospitals = {}
+    for hospital_id, name in Hospital.objects.values_list('id', 'name'):
+        hospitals[str(hospital_id)] = hospital_id
+        hospitals[name.strip().casefold()] = hospital_id
+    departments = {code.casefold(): (pk, hospital_id)
+                   for pk, code, hospital_id in Department.objects.order_by().values_list('id', 'code', 'hospital_id')}
+    taken_usernames = set(CustomUser.objects.order_by().values_list('username', flat=True))
+    employee_numbers = [(row.get('employee_number') or '').strip() for _, row in rows]
+    taken_numbers = set()
+    for i in range(0, len(employee_numbers), batch_size):
+        taken_numbers.update(CustomUser.objects.filter(
+            employee_number__in=employee_numbers[i:i + batch_size]
+        ).order_by().values_list('employee_number', flat=True))
+
+    users = []
+    passwords = []
+    department_links = []
+    for line, row in rows:
+        row = {key: (row.get(key) or '').strip() for key in STAFF_COLUMNS}
+        if not row['full_name'] or not row['employee_number']:
+            report.reject(line, 'Не указаны ФИО или номер сотрудника')
+            continue
+        try:
+            _validate_field('employee_number', row['employee_number'])
+            if row['phone_number']:
+                _validate_field('phone_number', row['phone_number'])
+        except ValidationError as e:
+            report.reject(line, '; '.join(e.messages))
+            continue
+        if row['employee_number'] in taken_numbers:
+            report.reject(line, f"Номер сотрудника {row['employee_number']} уже занят")
+            continue
+
+        hospital_id = None
+        if row['hospital']:
+            hospital_id = hospitals.get(row['hospital']) or hospitals.get(row['hospital'].casefold())
+            if hospital_id is None:
+                report.reject(line, f"Больница не найдена: {row['hospital']}")
+                continue
+
+        codes = [code for code in DEPARTMENT_SPLIT_RE.split(row['departments']) if code]
+        department_ids = []
+        for code in codes:
+            department = departments.get(code.casefold())
+            if department is None or department[1] != hospital_id:
+                report.reject(line, f'Отделение {code} не найдено в больнице сотрудника')
+                break
+            department_ids.append(department[0])
+        else:
+            username = pick_unique_username(build_base_username(row['full_name']), taken_usernames)
+            taken_usernames.add(username)
+            taken_numbers.add(row['employee_number'])
+            users.append(CustomUser(
+                username=username,
+                full_name=row['full_name'],
+                position=row['position'],
+                employee_number=row['employee_number'],
+                phone_number=row['phone_number'],
+                hospital_id=hospital_id,
+            ))
+            passwords.append(row['password'] or None)
+            department_links.append(department_ids)
+
+    # PBKDF2 в hashlib отпускает GIL, поэтому хеши считаются параллельно в потоках
+    with ThreadPoolExecutor(max_workers=max(hash_workers, 1)) as pool:
+        hashes = list(pool.map(make_password, passwords))
+    for user, password_hash in zip(users, hashes):
+        user.password = password_hash
+
+    Through = CustomUser.departments.through
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(users, batch_size=batch_size)
+        Through.objects.bulk_create(
+            [
+                Through(customuser_id=user.pk, department_id=department_id)
+                for user, department_ids in zip(users, department_links)
+                for department_id in department_ids
+            ],
+            batch_size=batch_size
+        )
+
+    report.created = len(users)
+    return report.finish()
+
+
+def normalize_snils_batch(values):
+    return [NON_DIGITS_RE.sub('', value or '') for value in values]
+
+
+def snils_checksum_valid(digits):
+    if len(digits) != 11 or not digits.isdigit():
+        return False
+    number, control = digits[:9], int(digits[9:])
+    # Номера до 001-001-998 выдавались без контрольной суммы
+    if int(number) <= 1001998:
+        return True
+    total = sum(int(digit) * (9 - i) for i, digit in enumerate(number))
+    if total > 101:
+        total %= 101
+    return control == (0 if total in (100, 101) else total)
+
+
+def _parse(value, formats):
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def _build_patient(hospital, row):
+    birth_date = _parse(row['birth_date'], DATE_FORMATS)
+    if not row['last_name'] or not row['first_name'] or birth_date is None:
+        return None, 'Не указаны фамилия, имя или дата рождения'
+    gender = GENDERS.get(row['gender'][:1].lower())
+    if gender is None:
+        return None, f"Неизвестный пол: {row['gender']}"
+    try:
+        height, weight = int(row['height']), int(row['weight'])
+    except ValueError:
+        return None, 'Рост и вес должны быть целыми числами'
+    if not HEIGHT_RANGE[0] <= height <= HEIGHT_RANGE[1]:
+        return None, f'Рост должен быть от {HEIGHT_RANGE[0]} до {HEIGHT_RANGE[1]} см: {height}'
+    if not WEIGHT_RANGE[0] <= weight <= WEIGHT_RANGE[1]:
+        return None, f'Вес должен быть от {WEIGHT_RANGE[0]} до {WEIGHT_RANGE[1]} кг: {weight}'
+    return Patient(
+        hospital=hospital,
+        last_name=row['last_name'][:50],
+        first_name=row['first_name'][:50],
+        middle_name=row['middle_name'][:50],
+        birth_date=birth_date.date(),
+        birth_place=row['birth_place'][:100],
+        snils=row['snils'],
+        gender=gender,
+        height=height,
+        weight=weight,
+    ), None
+
+
+def _build_admission(departments, row):
+    if not row['department']:
+        return None, None
+    department_id = departments.get(row['department'].casefold())
+    if department_id is None:
+        return None, f"Отделение не найдено: {row['department']}"
+    admission_date = timezone.now()
+    if row['admission_date']:
+        parsed = _parse(row['admission_date'], DATETIME_FORMATS)
+        if parsed is None:
+            return None, f"Неверная дата поступления: {row['admission_date']}"
+        admission_date = timezone.make_aware(parsed)
+    return Admission(
+        department_id=department_id,
+        room_number=row['room_number'][:10],
+        diagnosis=row['diagnosis'],
+        admission_date=admission_date,
+    ), None
+
+
+def _save_patient_batch(hospital, batch, report):
+    # Одна выборка на пачку: какие из СНИЛС уже есть в больнице
+    existing = set(
+        Patient.objects.filter(hospital=hospital, snils__in=[patient.snils for _, patient, _ in batch])
+        .order_by().values_list('snils', flat=True)
+    )
+    patients, admissions = [], []
+    for line, patient, admission in batch:
+        if patient.snils in existing:
+            report.reject(line, f'Пациент со СНИЛС {patient.snils} уже существует')
+            continue
+        existing.add(patient.snils)
+        if admission is not None:
+            patient.last_admission_date = admission.admission_date
+            patient.is_hospitalized = True
+        patients.append(patient)
+        admissions.append(admission)
+
+    with transaction.atomic():
+        Patient.objects.bulk_create(patients)
+        PatientSearchIndex.objects.bulk_create([build_search_entry(patient) for patient in patients])
+        opened = []
+        for patient, admission in zip(patients, admissions):
+            if admission is not None:
+                admission.patient_id = patient.pk
+                opened.append(admission)
+        Admission.objects.bulk_create(opened)
+        DepartmentCensus.objects.bulk_create([build_census_entry(admission) for admission in opened])
+    bump_fragment_version('department', *(admission.department_id for admission in opened))
+    report.created += len(patients)
+
+
+def import_patients(file, hospital, batch_size=2000, progress=None, max_rejected=MAX_REJECTED):
+    # Файл читается потоково, в памяти держится только текущая пачка строк
+    # и не больше max_rejected отклонённых строк
+    report = ImportReport(max_rejected)
+    departments = {
+        code.casefold(): pk
+        for pk, code in Department.objects.filter(hospital=hospital).order_by().values_list('id', 'code')
+    }
+
+    def flush(chunk):
+        snils_values = normalize_snils_batch([row.get('snils') for _, row in chunk])
+        batch = []
+        seen = set()
+        for (line, row), snils in zip(chunk, snils_values):
+            row = {key: (row.get(key) or '').strip() for key in PATIENT_COLUMNS}
+            row['snils'] = snils
+            if not snils_checksum_valid(snils):
+                report.reject(line, f"Неверный СНИЛС: {row['snils'] or '-'}")
+                continue
+            if snils in seen:
+                report.reject(line, f'СНИЛС {snils} повторяется в файле')
+                continue
+            patient, error = _build_patient(hospital, row)
+            if error is None:
+                admission, error = _build_admission(departments, row)
+            if error is not None:
+                report.reject(line, error)
+                continue
+            seen.add(snils)
+            batch.append((line, patient, admission))
+        _save_patient_batch(hospital, batch, report)
+        if progress:
+            progress(report)
+
+    chunk = []
+    for line, row in enumerate(read_csv(file), start=2):
+        chunk.append((line, row))
+        if len(chunk) >= batch_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return report.finish()
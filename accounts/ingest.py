@@ -0,0 +1,197 @@
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .events import publish_on_commit, vitals_event_data
+from .models import Admission, HealthNote
+
+MAX_INGEST_BATCH = 10000
+# Допустимое опережение часов монитора
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+# Поле показания -> (тип, минимум, максимум); имена совпадают с выгрузкой записей
+VITAL_RANGES = {
+    'hr_value': (int, 20, 300),
+    'systolic_value': (int, 40, 300),
+    'diastolic_value': (int, 20, 200),
+    'temperature_value': (Decimal, Decimal('30.0'), Decimal('45.0')),
+}
+READING_FIELDS = ('reading_id', 'admission_id', 'created_at', *VITAL_RANGES)
+# Сколько раз перечитывать уже записанные показания при гонке двух пакетов
+INSERT_ATTEMPTS = 3
+
+
+class IngestError(ValueError):
+    pass
+
+
+def parse_jsonl(lines):
+    readings = []
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            readings.append(json.loads(line))
+        except ValueError:
+            raise IngestError(f'Строка {number}: неверный JSON')
+        if len(readings) > MAX_INGEST_BATCH:
+            raise IngestError(f'Не больше {MAX_INGEST_BATCH} показаний за запрос')
+    return readings
+
+
+def _to_number(kind, value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        if kind is Decimal:
+            number = Decimal(str(value)).quantize(Decimal('0.1'))
+            return number if number.is_finite() else None
+        number = int(value)
+        return number if number == value else None
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _column_errors(column, values, errors):
+    # Проверки идут по столбцам: одно правило на весь столбец за один проход
+    if column == 'reading_id':
+        for i, value in enumerate(values):
+            if not isinstance(value, str) or not 0 < len(value) <= 64:
+                errors.setdefault(i, {})[column] = 'Строка от 1 до 64 символов'
+        return values
+    if column == 'admission_id':
+        parsed = [value if isinstance(value, int) and not isinstance(value, bool) else None for value in values]
+        for i, value in enumerate(parsed):
+            if value is None:
+                errors.setdefault(i, {})[column] = 'Ожидается ID поступления'
+        return parsed
+    if column == 'created_at':
+        latest = timezone.now() + MAX_CLOCK_SKEW
+        parsed = []
+        for i, value in enumerate(values):
+            try:
+                moment = parse_datetime(value) if isinstance(value, str) else None
+            except ValueError:
+                # Верный формат, но несуществующая дата (например, 30 февраля)
+                moment = None
+            if moment is not None and timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            if moment is None or moment > latest:
+                errors.setdefault(i, {})[column] = 'Ожидается время измерения не из будущего'
+                moment = None
+            parsed.append(moment)
+        return parsed
+
+    kind, low, high = VITAL_RANGES[column]
+    parsed = [_to_number(kind, value) for value in values]
+    for i, (raw, value) in enumerate(zip(values, parsed)):
+        if raw is not None and (value is None or not low <= value <= high):
+            errors.setdefault(i, {})[column] = f'Допустимо от {low} до {high}'
+    return parsed
+
+
+def validate_readings(readings):
+    errors = {}
+    rows = [reading if isinstance(reading, dict) else {} for reading in readings]
+    columns = {column: _column_errors(column, [row.get(column) for row in rows], errors) for column in READING_FIELDS}
+    for i, reading in enumerate(readings):
+        if not isinstance(reading, dict):
+            errors[i] = {'reading': 'Ожидается объект'}
+    for i in range(len(rows)):
+        if i not in errors and all(columns[column][i] is None for column in VITAL_RANGES):
+            errors[i] = {'reading': 'Нет ни одного показателя'}
+    valid = [
+        {column: values[i] for column, values in columns.items()}
+        for i in range(len(rows)) if i not in errors
+    ]
+    return valid, errors
+
+
+def _build_note(reading):
+    systolic, diastolic = reading['systolic_value'], reading['diastolic_value']
+    return HealthNote(
+        admission_id=reading['admission_id'],
+        client_reading_id=reading['reading_id'],
+        note_type='info',
+        created_at=reading['created_at'],
+        hr_value=reading['hr_value'],
+        temperature_value=reading['temperature_value'],
+        systolic_value=systolic,
+        diastolic_value=diastolic,
+        valueHigh=None if systolic is None else str(systolic),
+        valueLow=None if diastolic is None else str(diastolic),
+    )
+
+
+def _insert_new_notes(unique, admission_ids):
+    # Без ignore_conflicts: в итог, версии и события попадают только строки,
+    # которые действительно вставлены. Если параллельный пакет успел записать
+    # то же показание, вставка откатывается до точки сохранения и повторяется
+    reading_ids = {reading_id for _, reading_id in unique}
+    for attempt in range(INSERT_ATTEMPTS):
+        existing = set(
+            HealthNote.objects.filter(
+                admission_id__in=admission_ids, client_reading_id__in=reading_ids
+            ).values_list('admission_id', 'client_reading_id')
+        )
+        notes = [_build_note(reading) for key, reading in unique.items() if key not in existing]
+        try:
+            with transaction.atomic():
+                HealthNote.objects.bulk_create(notes)
+            return notes
+        except IntegrityError:
+            if attempt == INSERT_ATTEMPTS - 1:
+                raise
+
+
+def ingest_readings(hospital, readings):
+    # Весь пакет пишется одной транзакцией через bulk_create; повтор того же
+    # reading_id в поступлении (переотправка монитором) пропускается, а не дублируется
+    if len(readings) > MAX_INGEST_BATCH:
+        raise IngestError(f'Не больше {MAX_INGEST_BATCH} показаний за запрос')
+    valid, errors = validate_readings(readings)
+
+    admission_ids = {reading['admission_id'] for reading in valid}
+    # ID поступления -> отделение для табло (None, если пациент уже выписан)
+    allowed = {
+        pk: department_id if discharge_date is None else None
+        for pk, department_id, discharge_date in Admission.objects.filter(
+            pk__in=admission_ids, patient__hospital=hospital
+        ).values_list('pk', 'department_id', 'discharge_date')
+    }
+    for i, reading in enumerate(readings):
+        if i not in errors and reading['admission_id'] not in allowed:
+            errors[i] = {'admission_id': 'Поступление не найдено'}
+    valid = [reading for reading in valid if reading['admission_id'] in allowed]
+
+    # Мониторы разных больниц не согласуют ID показаний, поэтому ключ -
+    # пара (поступление, reading_id), а не reading_id сам по себе
+    unique = {}
+    for reading in valid:
+        unique.setdefault((reading['admission_id'], reading['reading_id']), reading)
+    with transaction.atomic():
+        notes = _insert_new_notes(unique, allowed)
+        # bulk_create не вызывает сигналы, поэтому версию печатной истории поднимаем сами
+        latest = {}
+        for note in notes:
+            if note.admission_id not in latest or note.created_at > latest[note.admission_id].created_at:
+                latest[note.admission_id] = note
+        if latest:
+            Admission.bump_content_version(pk__in=latest)
+        # На табло уходит только последнее показание каждого пациента из пакета
+        for admission_id, note in latest.items():
+            if allowed[admission_id] is not None:
+                publish_on_commit(allowed[admission_id], 'vitals', vitals_event_data(note))
+
+    return {
+        'received': len(readings),
+        'created': len(notes),
+        'duplicates': len(valid) - len(notes),
+        'errors': [{'index': i, 'errors': errors[i]} for i in sorted(errors)],
+    }
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import HealthNote, parse_pressure
+
+
+class Command(BaseCommand):
+    help = 'Заполняет числовые поля АД записей из строковых valueHigh/valueLow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-id', type=int, default=0,
+                            help='Продолжить с записи, следующей за указанным ID')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = options['start_id']
+        pending = HealthNote.objects.filter(
+            Q(valueHigh__isnull=False, systolic_value__isnull=True)
+            | Q(valueLow__isnull=False, diastolic_value__isnull=True)
+        ).exclude(valueHigh='', valueLow='').order_by('pk')
+
+        converted = 0
+        invalid = []
+        while True:
+            rows = list(pending.filter(pk__gt=last_id).only('id', 'valueHigh', 'valueLow')[:batch_size])
+            if not rows:
+                break
+
+            changed = []
+            for note in rows:
+                high = parse_pressure(note.valueHigh)
+                low = parse_pressure(note.valueLow)
+                if (note.valueHigh and high is None) or (note.valueLow and low is None):
+                    invalid.append((note.pk, note.valueHigh, note.valueLow))
+                if high is not None or low is not None:
+                    note.systolic_value = high
+                    note.diastolic_value = low
+                    changed.append(note)
+
+            with transaction.atomic():
+                HealthNote.objects.bulk_update(changed, ['systolic_value', 'diastolic_value'])
+            converted += len(changed)
+            last_id = rows[-1].pk
+            self.stdout.write(f'Обработано до ID {last_id}, преобразовано: {converted}')
+
+        for pk, high, low in invalid:
+            self.stdout.write(self.style.WARNING(f'Запись {pk}: не удалось разобрать АД {high!r}/{low!r}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: преобразовано {converted}, с ошибками {len(invalid)}'
+        ))
@@ -0,0 +1,90 @@
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from accounts.models import CustomUser
+from accounts.synthetic import throwaway_database
+
+BENCH_PASSWORD = 'bench-password-123'
+
+
+class Command(BaseCommand):
+    help = 'Замеряет пропускную способность входа: входов в секунду и запросов на вход'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--failed-ratio', type=float, default=0.2,
+                            help='Доля попыток с неверным паролем или логином')
+        parser.add_argument('--fast-hasher', action='store_true',
+                            help='MD5 вместо PBKDF2, чтобы измерять только работу с базой')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        hashers = ['django.contrib.auth.hashers.MD5PasswordHasher'] if options['fast_hasher'] else None
+        rng = random.Random(options['seed'])
+
+        # Тестовые сотрудники создаются в отдельной базе, которая удаляется в конце
+        with tempfile.TemporaryDirectory(prefix='bench-login-') as workdir, \
+                throwaway_database(Path(workdir) / 'bench.sqlite3'):
+            with override_settings(**({'PASSWORD_HASHERS': hashers} if hashers else {})):
+                users = self.create_users(options['users'])
+                attempts = self.build_attempts(users, options['logins'], options['failed_ratio'], rng)
+                result = self.run(attempts)
+
+        result['hasher'] = 'md5' if hashers else 'default'
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
+
+    def create_users(self, count):
+        template = CustomUser(full_name='Бенчмарк Сотрудник', position='-', phone_number='+70000000000')
+        template.set_password(BENCH_PASSWORD)
+        users = [
+            CustomUser(
+                employee_number=str(9000000000 + i),
+                username=f'bench_user_{i}',
+                full_name=template.full_name,
+                position=template.position,
+                phone_number=template.phone_number,
+                password=template.password,
+            )
+            for i in range(count)
+        ]
+        return CustomUser.objects.bulk_create(users)
+
+    def build_attempts(self, users, count, failed_ratio, rng):
+        attempts = []
+        for _ in range(count):
+            user = rng.choice(users)
+            login = user.employee_number if rng.random() < 0.5 else user.username
+            if rng.random() < failed_ratio:
+                if rng.random() < 0.5:
+                    attempts.append((login, 'wrong-password', False))
+                else:
+                    attempts.append(('nobody', BENCH_PASSWORD, False))
+            else:
+                attempts.append((login, BENCH_PASSWORD, True))
+        return attempts
+
+    def run(self, attempts):
+        errors = 0
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for login, password, expected in attempts:
+                if (authenticate(username=login, password=password) is not None) != expected:
+                    errors += 1
+            elapsed = time.perf_counter() - started
+
+        return {
+            'logins': len(attempts),
+            'seconds': round(elapsed, 3),
+            'logins_per_second': round(len(attempts) / elapsed, 1) if elapsed else None,
+            'queries_per_login': round(len(queries) / len(attempts), 2) if attempts else 0,
+            'unexpected_results': errors,
+        }
@@ -0,0 +1,170 @@
+import json
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+from django.urls import URLPattern, reverse
+
+from accounts.models import Admission, CustomUser, HealthNote
+from accounts.synthetic import generate, throwaway_database
+from accounts.urls import urlpatterns
+
+# Страницы, которые меняют состояние сессии при GET
+SKIP_URLS = {'logout'}
+# Отказ в доступе или отсутствующий объект: замерялась бы не сама страница
+FAILED_STATUSES = {401, 403, 404}
+QUERY_STRINGS = {
+    'patients': lambda sample: f"?last_name={sample['patient'].last_name[:3]}",
+    'patient_search': lambda sample: f"?q={sample['patient'].last_name[:4]}",
+    'export': lambda sample: '?format=jsonl',
+}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Для каждого объёма данных создаёт отдельную тестовую базу с синтетическими данными, '
+        'замеряет все страницы accounts/urls.py и выводит перцентили задержки и число запросов в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='200,2000', help='Пациентов на больницу, через запятую')
+        parser.add_argument('--hospitals', type=int, default=2)
+        parser.add_argument('--months', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Файл для результата (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes должен быть списком целых чисел')
+
+        result = {'commit': current_commit(), 'repeat': options['repeat'], 'sizes': []}
+        workdir = Path(tempfile.mkdtemp(prefix='bench-views-'))
+        setup_test_environment()
+        try:
+            with override_settings(CASE_HISTORY_CACHE_DIR=str(workdir / 'case_history')):
+                for size in sizes:
+                    with throwaway_database(workdir / 'bench.sqlite3'):
+                        result['sizes'].append(self.bench_size(size, options))
+        finally:
+            teardown_test_environment()
+
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output, encoding='utf-8')
+        else:
+            self.stdout.write(output)
+
+    def bench_size(self, size, options):
+        cache.clear()
+        started = time.perf_counter()
+        counts = generate(hospitals=options['hospitals'], patients=size, months=options['months'],
+                          seed=options['seed'])
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'{size} пациентов на больницу: данные созданы за {elapsed:.1f} с')
+        sample = self.pick_sample()
+        client = Client()
+        client.force_login(sample['user'])
+        urls = [self.measure(client, name, url, options) for name, url in self.build_urls(sample)]
+        failed = [f"{url['name']} ({url['status']})" for url in urls
+                  if url['status'] in FAILED_STATUSES or url['status'] >= 500]
+        if failed:
+            raise CommandError('Страницы ответили ошибкой, замер недостоверен: ' + ', '.join(failed))
+        return {'patients_per_hospital': size, 'rows': counts, 'urls': urls}
+
+    def pick_sample(self):
+        admissions = Admission.objects.select_related('patient')
+        # При малом объёме данных все госпитализации могут быть уже завершены
+        admission = (
+            admissions.filter(discharge_date__isnull=True).order_by('id').first()
+            or admissions.order_by('-discharge_date', 'id').first()
+        )
+        if admission is None:
+            raise CommandError('В синтетических данных нет госпитализаций, увеличьте --sizes или --months')
+        user = CustomUser.objects.filter(
+            hospital_id=admission.patient.hospital_id, departments=admission.department_id
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError(f'Нет сотрудника с доступом к отделению {admission.department_id}')
+        # Без права на выгрузку страница export отвечает 403 и замер ничего не показывает
+        user.user_permissions.add(Permission.objects.get(content_type__app_label='accounts', codename='export_data'))
+        return {
+            'user': user,
+            'patient': admission.patient,
+            'admission': admission,
+            'department_id': admission.department_id,
+            'note_id': HealthNote.objects.filter(admission=admission).values_list('id', flat=True).first(),
+        }
+
+    def build_urls(self, sample):
+        kwargs_by_name = {
+            'department_id': sample['department_id'],
+            'patient_id': sample['patient'].pk,
+            'admission_id': sample['admission'].pk,
+            'note_id': sample['note_id'],
+            'dataset': 'admissions',
+        }
+        for pattern in urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name or pattern.name in SKIP_URLS:
+                continue
+            kwargs = {key: kwargs_by_name[key] for key in pattern.pattern.converters}
+            if None in kwargs.values():
+                continue
+            query = QUERY_STRINGS.get(pattern.name, lambda sample: '')(sample)
+            yield pattern.name, reverse(pattern.name, kwargs=kwargs) + query
+
+    def fetch(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, client, name, url, options):
+        for _ in range(options['warmup']):
+            self.fetch(client, url)
+        timings = []
+        for _ in range(options['repeat']):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = self.fetch(client, url)
+                timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'name': name,
+            'url': url,
+            'status': response.status_code,
+            'queries': len(queries),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p90_ms': round(percentile(timings, 90), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'max_ms': round(max(timings), 2),
+        }
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.census import find_census_errors, rebuild_census
+
+
+class Command(BaseCommand):
+    help = 'Проверяет таблицу пациентов в отделениях на соответствие активным госпитализациям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Перестроить таблицу при расхождениях')
+
+    def handle(self, *args, **options):
+        errors = find_census_errors()
+        for kind, admission_ids in errors.items():
+            if admission_ids:
+                self.stdout.write(f'{kind}: {len(admission_ids)} (поступления: {admission_ids[:20]})')
+
+        if not any(errors.values()):
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+            return
+
+        if not options['fix']:
+            raise CommandError('Найдены расхождения, запустите команду с --fix')
+
+        total = rebuild_census()
+        self.stdout.write(self.style.SUCCESS(f'Таблица перестроена, активных госпитализаций: {total}'))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.sessions import SessionStore
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие сессии из django_session короткими пачками; с --loop работает как фоновый процесс'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SESSION_CLEANUP_BATCH_SIZE,
+                            help='Сессий в одной транзакции')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Пауза между пачками в секундах, чтобы пропускать клинические записи')
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+                            help='Повторять очистку с этим интервалом (0 - один проход)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        while True:
+            deleted = SessionStore.clear_expired(batch_size=options['batch_size'], pause=options['pause'])
+            self.stdout.write(f'Удалено истёкших сессий: {deleted}')
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['loop'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import exports
+from accounts.models import HealthNote, Hospital
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка госпитализаций или записей больницы в CSV / JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--hospital', type=int, required=True, help='ID больницы')
+        parser.add_argument('--format', choices=sorted(exports.EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument('--from', dest='date_from', help='Начальная дата, ГГГГ-ММ-ДД')
+        parser.add_argument('--to', dest='date_to', help='Конечная дата включительно, ГГГГ-ММ-ДД')
+        parser.add_argument('--department', help='ID или код отделения')
+        parser.add_argument('--note-type', choices=[choice for choice, _ in HealthNote.NOTE_TYPE_CHOICES])
+
+    def handle(self, *args, **options):
+        try:
+            hospital = Hospital.objects.get(pk=options['hospital'])
+        except Hospital.DoesNotExist:
+            raise CommandError(f"Больница {options['hospital']} не найдена")
+        try:
+            filters = exports.parse_filters(
+                date_from=options['date_from'],
+                date_to=options['date_to'],
+                department=options['department'],
+                note_type=options['note_type']
+            )
+        except exports.ExportFilterError as e:
+            raise CommandError(str(e))
+
+        chunks = exports.export(options['dataset'], hospital, options['format'], filters)
+        if options['output']:
+            lines = 0
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    lines += 1
+            self.stderr.write(self.style.SUCCESS(f"Выгружено строк: {lines} -> {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,68 @@
+import base64
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.assets import VENDOR_FILES, VENDOR_LOCK_FILE
+
+# Карты исходников не скачиваются, а ссылка на отсутствующую карту ломает collectstatic
+SOURCE_MAP_RE = re.compile(rb'\n?(/\*# sourceMappingURL=\S+ \*/|//# sourceMappingURL=\S+)\s*$')
+
+
+def integrity(data):
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode()
+
+
+class Command(BaseCommand):
+    help = (
+        'Скачивает закреплённые версии Bootstrap, jQuery, Font Awesome и Chart.js в static/vendor '
+        'и записывает их хеши в vendor-lock.json; с --check сверяет файлы с lock-файлом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только проверить уже скачанные файлы')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        root = Path(settings.STATICFILES_DIRS[0])
+        lock_path = root / VENDOR_LOCK_FILE
+        if options['check']:
+            return self.verify(root, lock_path)
+
+        lock = {}
+        with requests.Session() as session:
+            for path, url in sorted(VENDOR_FILES.items()):
+                try:
+                    response = session.get(url, timeout=options['timeout'])
+                    response.raise_for_status()
+                except requests.exceptions.RequestException as e:
+                    raise CommandError(f'Не удалось скачать {url}: {e}')
+                data = response.content
+                if path.endswith(('.css', '.js')):
+                    data = SOURCE_MAP_RE.sub(b'\n', data)
+                target = root / path
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(data)
+                lock[path] = {'url': url, 'integrity': integrity(data)}
+                self.stdout.write(f'{path} ({len(data)} байт)')
+
+        lock_path.write_text(json.dumps(lock, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Скачано файлов: {len(lock)}'))
+
+    def verify(self, root, lock_path):
+        if not lock_path.is_file():
+            raise CommandError(f'Нет {lock_path}, сначала запустите команду без --check')
+        lock = json.loads(lock_path.read_text(encoding='utf-8'))
+        problems = [path for path in VENDOR_FILES if path not in lock]
+        for path, entry in lock.items():
+            target = root / path
+            if not target.is_file() or integrity(target.read_bytes()) != entry['integrity']:
+                problems.append(path)
+        if problems:
+            raise CommandError('Отсутствуют или изменены: ' + ', '.join(sorted(problems)))
+        self.stdout.write(self.style.SUCCESS(f'Проверено файлов: {len(lock)}'))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = 'Создаёт синтетические больницы с отделениями, персоналом, пациентами, поступлениями и записями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospitals', type=int, default=1)
+        parser.add_argument('--departments', type=int, default=5, help='Отделений на больницу')
+        parser.add_argument('--staff', type=int, default=20, help='Сотрудников на больницу')
+        parser.add_argument('--patients', type=int, default=500, help='Пациентов на больницу')
+        parser.add_argument('--months', type=int, default=3, help='Период госпитализаций и записей')
+        parser.add_argument('--vitals-per-day', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        def progress(counts):
+            self.stdout.write(f"Пациентов: {counts['patients']}, поступлений: {counts['admissions']}, "
+                              f"записей: {counts['notes']}")
+
+        started = time.perf_counter()
+        counts = generate(
+            hospitals=options['hospitals'],
+            departments=options['departments'],
+            staff=options['staff'],
+            patients=options['patients'],
+            months=options['months'],
+            vitals_per_day=options['vitals_per_day'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        summary = ', '.join(f'{name}: {value}' for name, value in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Создано за {time.perf_counter() - started:.1f} с - {summary}'))
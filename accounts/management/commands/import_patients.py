@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importers import PATIENT_COLUMNS, import_patients
+from accounts.models import Hospital
+
+
+class Command(BaseCommand):
+    help = (
+        f"Потоково импортирует пациентов из CSV (колонки: {', '.join(PATIENT_COLUMNS)}); "
+        "при заполненном department открывается госпитализация"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--hospital', type=int, required=True, help='ID больницы')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--show-rejected', type=int, default=100,
+                            help='Сколько отклонённых строк сохранить и вывести')
+
+    def handle(self, *args, **options):
+        try:
+            hospital = Hospital.objects.get(pk=options['hospital'])
+        except Hospital.DoesNotExist:
+            raise CommandError(f"Больница {options['hospital']} не найдена")
+
+        def progress(report):
+            self.stdout.write(f'Создано: {report.created}, отклонено: {report.rejected_count}')
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                report = import_patients(f, hospital, batch_size=options['batch_size'], progress=progress,
+                                         max_rejected=options['show_rejected'])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for line, reason in report.rejected:
+            self.stdout.write(self.style.WARNING(f'Строка {line}: {reason}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пациентов: {report.created}, отклонено строк: {report.rejected_count}, '
+            f'{report.seconds:.1f} с ({report.rows_per_second} строк/с)'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importers import STAFF_COLUMNS, import_staff
+
+
+class Command(BaseCommand):
+    help = f"Импортирует сотрудников из CSV (колонки: {', '.join(STAFF_COLUMNS)})"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--hash-workers', type=int, default=4,
+                            help='Сколько потоков хешируют пароли')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Байты, а не текст: кодировку (UTF-8 или cp1251 из Excel) определяет decode_csv
+        try:
+            with open(options['path'], 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            report = import_staff(data, hash_workers=options['hash_workers'], batch_size=options['batch_size'])
+        except UnicodeDecodeError:
+            raise CommandError('Не удалось прочитать файл: сохраните CSV в UTF-8 или Windows-1251')
+
+        for line, reason in report.rejected:
+            self.stdout.write(self.style.WARNING(f'Строка {line}: {reason}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано сотрудников: {report.created}, отклонено строк: {report.rejected_count}, '
+            f'{report.seconds:.2f} с ({report.rows_per_second} строк/с)'
+        ))
@@ -0,0 +1,64 @@
+import csv
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.mkb10 import reset_index
+from accounts.models import Mkb10Code
+
+
+def read_entries(path):
+    if path.suffix == '.json':
+        with path.open(encoding='utf-8') as f:
+            rows = json.load(f)
+        return [(row['code'], row['name']) for row in rows]
+
+    if path.suffix == '.jsonl':
+        with path.open(encoding='utf-8') as f:
+            return [(row['code'], row['name']) for row in map(json.loads, filter(str.strip, f))]
+
+    with path.open(encoding='utf-8-sig', newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+        reader = csv.reader(f, dialect)
+        rows = [row for row in reader if len(row) >= 2]
+    # Заголовок допускается, но не обязателен
+    if rows and rows[0][0].strip().lower() in ('code', 'код', 'mkb_code'):
+        rows = rows[1:]
+    return [(row[0], row[1]) for row in rows]
+
+
+class Command(BaseCommand):
+    help = 'Загружает справочник МКБ-10 из CSV (код;наименование), JSON или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Файл справочника (по умолчанию MKB10_DATA_FILE)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'] or getattr(settings, 'MKB10_DATA_FILE', ''))
+        if not path.is_file():
+            raise CommandError(f'Файл справочника не найден: {path}')
+
+        entries = {}
+        skipped = 0
+        for code, name in read_entries(path):
+            code, name = code.strip(), ' '.join(name.split())
+            if not code or not name or len(code) > 16:
+                skipped += 1
+                continue
+            entries[code] = name[:500]
+
+        with transaction.atomic():
+            Mkb10Code.objects.all().delete()
+            Mkb10Code.objects.bulk_create(
+                [Mkb10Code(code=code, name=name) for code, name in sorted(entries.items())],
+                batch_size=options['batch_size']
+            )
+        reset_index()
+
+        self.stdout.write(self.style.SUCCESS(f'Загружено диагнозов: {len(entries)}, пропущено строк: {skipped}'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Subquery
+
+from accounts.models import Admission, Patient
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дату последнего поступления и статус госпитализации пациентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospital', type=int, help='ID больницы (по умолчанию все больницы)')
+
+    def handle(self, *args, **options):
+        admissions = Admission.objects.filter(patient=OuterRef('pk'))
+        patients = Patient.objects.all()
+        if options['hospital']:
+            patients = patients.filter(hospital_id=options['hospital'])
+
+        updated = patients.update(
+            last_admission_date=Subquery(
+                admissions.order_by('-admission_date').values('admission_date')[:1]
+            ),
+            is_hospitalized=Exists(admissions.filter(discharge_date__isnull=True))
+        )
+        self.stdout.write(self.style.SUCCESS(f'Обновлено пациентов: {updated}'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Patient, PatientSearchIndex
+from accounts.search import build_search_entry
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс ФИО пациентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospital', type=int, help='ID больницы (по умолчанию все больницы)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        patients = Patient.objects.only('id', 'hospital_id', 'last_name', 'first_name', 'middle_name')
+        entries = PatientSearchIndex.objects.all()
+        if options['hospital']:
+            patients = patients.filter(hospital_id=options['hospital'])
+            entries = entries.filter(hospital_id=options['hospital'])
+
+        batch_size = options['batch_size']
+        total = 0
+        with transaction.atomic():
+            entries.delete()
+            batch = []
+            for patient in patients.iterator(chunk_size=batch_size):
+                batch.append(build_search_entry(patient))
+                if len(batch) >= batch_size:
+                    PatientSearchIndex.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                PatientSearchIndex.objects.bulk_create(batch)
+                total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано пациентов: {total}'))
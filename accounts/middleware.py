@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .profiling import RequestProfile, current_profile
+
+logger = logging.getLogger('accounts.profiling')
+
+
+class SessionActivityMiddleware:
+    # Отмечает активность вошедшего пользователя не чаще раза в
+    # SESSION_ACTIVITY_RESOLUTION секунд; сама запись отметки в БД
+    # откладывается хранилищем accounts.sessions
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        touch = getattr(request.session, 'touch', None)
+        if touch is not None and request.user.is_authenticated:
+            touch()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        atouch = getattr(request.session, 'atouch', None)
+        if atouch is not None and (await request.auser()).is_authenticated:
+            await atouch()
+        return await self.get_response(request)
+
+
+class RequestProfilingMiddleware:
+    # Включается настройкой REQUEST_PROFILING. Считает запросы к БД, их время
+    # и время рендера шаблонов, отдаёт их в заголовке Server-Timing и пишет
+    # медленные запросы в журнал accounts.profiling. Выключенное не попадает
+    # в цепочку middleware вовсе.
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        os.makedirs(os.path.dirname(settings.REQUEST_PROFILING_LOG_FILE), exist_ok=True)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_query))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        profile.finish()
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        response['Server-Timing'] = profile.server_timing(view_name)
+        if (profile.total_time * 1000 >= settings.REQUEST_PROFILING_SLOW_MS
+                or len(profile.queries) >= settings.REQUEST_PROFILING_SLOW_QUERIES):
+            self.log_slow_request(request, response, profile, view_name)
+        return response
+
+    def log_slow_request(self, request, response, profile, view_name):
+        logger.warning(json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view_name,
+            'status': response.status_code,
+            'total_ms': round(profile.total_time * 1000, 1),
+            'sql_ms': round(profile.query_time * 1000, 1),
+            'queries': len(profile.queries),
+            'template_ms': None if profile.template_time is None else round(profile.template_time * 1000, 1),
+            'slowest': [{'sql': sql[:500], 'ms': round(duration * 1000, 2)} for sql, duration in profile.slowest()],
+            'duplicated': [{'sql': sql[:500], 'count': count} for sql, count in profile.duplicated()],
+        }, ensure_ascii=False))
@@ -0,0 +1,116 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Mkb10Code
+from .search import PREFIX_SENTINEL
+
+# Кириллические буквы, которые пишутся так же, как латинские: "А09" -> "A09"
+CODE_LOOKALIKES = str.maketrans('АВСЕНКМОРТХ', 'ABCEHKMOPTX')
+CODE_RE = re.compile(r'^[A-Z]\d{0,2}(\.\d*)?$')
+TOKEN_RE = re.compile(r'[0-9a-zа-я]+')
+
+
+def normalize_code(value):
+    return (value or '').strip().upper().translate(CODE_LOOKALIKES).replace(' ', '')
+
+
+def tokenize(value):
+    return TOKEN_RE.findall((value or '').casefold().replace('ё', 'е'))
+
+
+def _prefix_range(sorted_keys, prefix):
+    start = bisect_left(sorted_keys, (prefix,))
+    end = bisect_left(sorted_keys, (prefix + PREFIX_SENTINEL,))
+    return sorted_keys[start:end]
+
+
+class Mkb10Index:
+    def __init__(self, entries):
+        self.entries = entries
+        self.codes = sorted((normalize_code(code).replace('.', ''), i) for i, (code, _) in enumerate(entries))
+        self.tokens = sorted(
+            {(token, i) for i, (_, name) in enumerate(entries) for token in tokenize(name)}
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search_code(self, query):
+        prefix = normalize_code(query).replace('.', '')
+        return [i for _, i in _prefix_range(self.codes, prefix)]
+
+    def search_name(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        matches = None
+        # начинаем с самого длинного токена: у него самый узкий диапазон
+        for token in sorted(tokens, key=len, reverse=True):
+            found = {i for _, i in _prefix_range(self.tokens, token)}
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        first = tokens[0]
+        return sorted(
+            matches,
+            key=lambda i: (
+                not self.entries[i][1].casefold().replace('ё', 'е').startswith(first),
+                len(self.entries[i][1]),
+                self.entries[i][0],
+            )
+        )
+
+    def search(self, query, limit=100):
+        if CODE_RE.match(normalize_code(query)):
+            found = self.search_code(query)
+        else:
+            found = self.search_name(query)
+        return [self.entries[i] for i in found[:limit]]
+
+
+_index = None
+_index_version = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _catalog_version():
+    return tuple(Mkb10Code.objects.aggregate(count=Count('id'), last=Max('id')).values())
+
+
+def get_index():
+    global _index, _index_version, _index_checked_at
+    check_interval = getattr(settings, 'MKB10_INDEX_CHECK_INTERVAL', 60)
+    if _index is not None and time.monotonic() - _index_checked_at < check_interval:
+        return _index
+
+    with _index_lock:
+        if _index is not None and time.monotonic() - _index_checked_at < check_interval:
+            return _index
+        version = _catalog_version()
+        if _index is None or version != _index_version:
+            _index = Mkb10Index(list(Mkb10Code.objects.order_by('code').values_list('code', 'name')))
+            _index_version = version
+        _index_checked_at = time.monotonic()
+        return _index
+
+
+def reset_index():
+    global _index, _index_version
+    with _index_lock:
+        _index = None
+        _index_version = None
+
+
+def suggest(query, limit=100):
+    return {
+        'suggestions': [
+            {'value': name, 'data': {'code': code, 'name': name}}
+            for code, name in get_index().search(query, limit=limit)
+        ]
+    }
@@ -5,11 +5,46 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.text import slugify
 from django.contrib.auth.models import BaseUserManager
 from transliterate import translit
 
 
+def parse_pressure(value):
+    value = str(value).strip() if value is not None else ''
+    if not value.isdigit():
+        return None
+    value = int(value)
+    return value if 0 < value < 400 else None
+
+
+def build_base_username(full_name):
+    name_parts = full_name.split()
+    if len(name_parts) >= 2:
+        first_part = name_parts[0]
+        second_part = name_parts[1]
+        try:
+            first_en = translit(first_part, 'ru', reversed=True)
+            second_en = translit(second_part, 'ru', reversed=True)
+            base_username = f"{first_en}_{second_en}"
+        except:
+            base_username = f"{name_parts[0]}_{name_parts[1]}"
+    else:
+        base_username = name_parts[0] if name_parts else 'user'
+
+    return re.sub(r'[^a-z0-9_]', '', base_username.lower())
+
+
+def pick_unique_username(original, taken):
+    username = original
+    counter = 1
+    while username in taken:
+        username = f"{original}_{counter}"
+        counter += 1
+    return username
+
+
 class CustomUserManager(BaseUserManager):
     def create_superuser(self, employee_number, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
@@ -97,33 +132,31 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = 'employee_number'
     REQUIRED_FIELDS = ['full_name', 'position', 'phone_number']
 
+    @cached_property
+    def department_ids(self):
+        # Пользователь загружается заново на каждый запрос, поэтому это один
+        # запрос по индексу за запрос. Кэш между запросами держал бы отозванное
+        # отделение доступным в других процессах
+        return frozenset(
+            self.departments.through.objects.filter(customuser_id=self.pk).values_list('department_id', flat=True)
+        )
+
     def save(self, *args, **kwargs):
         if not self.username and self.full_name:
-            name_parts = self.full_name.split()
-            if len(name_parts) >= 2:
-                first_part = name_parts[0]
-                second_part = name_parts[1]
-                try:
-                    first_en = translit(first_part, 'ru', reversed=True)
-                    second_en = translit(second_part, 'ru', reversed=True)
-                    base_username = f"{first_en}_{second_en}"
-                except:
-                    base_username = f"{name_parts[0]}_{name_parts[1]}"
-            else:
-                base_username = name_parts[0] if name_parts else 'user'
-
-            self.username = re.sub(r'[^a-z0-9_]', '', base_username.lower())
-
-            original = self.username
-            counter = 1
-            while CustomUser.objects.filter(username=self.username).exclude(pk=self.pk).exists():
-                self.username = f"{original}_{counter}"
-                counter += 1
+            original = build_base_username(self.full_name)
+            # Все занятые варианты логина получаем одним запросом
+            taken = set(
+                CustomUser.objects.filter(username__startswith=original).exclude(pk=self.pk).values_list(
+                    'username', flat=True
+                )
+            )
+            self.username = pick_unique_username(original, taken)
 
         super().save(*args, **kwargs)
 
     class Meta:
         ordering = ['hospital', 'full_name']  # Правильный ordering
+        permissions = [('export_data', 'Может выгружать данные больницы')]
 
     def __str__(self):
         return f"{self.full_name} ({self.employee_number})"
@@ -173,11 +206,31 @@ class Patient(models.Model):
 
     @property
     def has_active_admission(self):
-        return self.admissions.filter(discharge_date__isnull=True).exists()
+        return self.is_hospitalized
+
+    @classmethod
+    def refresh_admission_summary(cls, patient_id):
+        summary = Admission.objects.filter(patient_id=patient_id).aggregate(
+            last_admission_date=models.Max('admission_date'),
+            active_count=models.Count('id', filter=models.Q(discharge_date__isnull=True))
+        )
+        cls.objects.filter(pk=patient_id).update(
+            last_admission_date=summary['last_admission_date'],
+            is_hospitalized=bool(summary['active_count'])
+        )
 
     height = models.PositiveSmallIntegerField(verbose_name='Рост (см)')
     weight = models.PositiveSmallIntegerField(verbose_name='Вес (кг)')
 
+    # Денормализованные данные о госпитализациях, обновляются сигналами Admission
+    last_admission_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Дата последнего поступления'
+    )
+    is_hospitalized = models.BooleanField(default=False, editable=False, verbose_name='В стационаре')
+
     def __str__(self):
         return f"{self.last_name} {self.first_name} {self.middle_name}"
 
@@ -188,6 +241,14 @@ class Patient(models.Model):
                 name='unique_snils_per_hospital'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['hospital', '-last_admission_date', '-id'],
+                name='patient_registry_idx'
+            ),
+            # Сортировка списка пациентов в админке и выборки по фамилии внутри больницы
+            models.Index(fields=['hospital', 'last_name', 'first_name'], name='patient_hospital_name_idx'),
+        ]
 
 
 class Admission(models.Model):
@@ -233,7 +294,8 @@ class Admission(models.Model):
         "Страховой анамнез: \n\n"
     )
 
-    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='admissions')
+    # Отдельный индекс по FK не нужен: его покрывает admission_patient_date_idx
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='admissions', db_index=False)
     admission_date = models.DateTimeField(default=timezone.now, verbose_name='Дата поступления')
     discharge_date = models.DateTimeField(null=True, blank=True, verbose_name='Дата выписки')
     severity = models.CharField(max_length=10, blank=True, choices=SEVERITY_CHOICES, verbose_name='Состояние')
@@ -288,6 +350,24 @@ class Admission(models.Model):
         blank=True
     )
     notes = models.TextField(blank=True, verbose_name='Иные записи о состоянии здоровья')
+    # Увеличивается при любом изменении поступления, пациента или записей;
+    # по нему определяется актуальность кэша печатной истории болезни
+    content_version = models.PositiveIntegerField(default=1, editable=False)
+
+    @classmethod
+    def bump_content_version(cls, **lookups):
+        cls.objects.filter(**lookups).update(content_version=models.F('content_version') + 1)
+
+    def save(self, *args, **kwargs):
+        # content_version меняется только через bump_content_version: обычное
+        # сохранение не пишет значение из памяти, иначе оно откатит параллельный bump
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'content_version' and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
 
     @property
     def is_active(self):
@@ -295,6 +375,22 @@ class Admission(models.Model):
 
     class Meta:
         ordering = ['-admission_date']
+        indexes = [
+            # История госпитализаций пациента в порядке Meta.ordering
+            models.Index(fields=['patient', '-admission_date'], name='admission_patient_date_idx'),
+            # Частичные индексы только по незакрытым поступлениям: их на порядки
+            # меньше, чем всех, и почти каждая страница ищет именно их
+            models.Index(
+                fields=['patient'],
+                name='admission_active_patient_idx',
+                condition=models.Q(discharge_date__isnull=True)
+            ),
+            models.Index(
+                fields=['department', 'room_number'],
+                name='admission_active_dept_idx',
+                condition=models.Q(discharge_date__isnull=True)
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient} - {self.admission_date.date()}"
@@ -308,11 +404,94 @@ class HealthNote(models.Model):
         ('note', 'Запись истории болезни'),
     ]
 
-    admission = models.ForeignKey(Admission, on_delete=models.CASCADE, related_name='entry_notes')
+    # Отдельный индекс по FK не нужен: его покрывает healthnote_admission_time_idx
+    admission = models.ForeignKey(Admission, on_delete=models.CASCADE, related_name='entry_notes', db_index=False)
     note_type = models.CharField(max_length=20, choices=NOTE_TYPE_CHOICES)
     text = models.TextField(blank=True, null=True)
     valueHigh = models.CharField(max_length=3, blank=True, null=True)
     valueLow = models.CharField(max_length=3, blank=True, null=True)
+    # Числовые значения АД, заполняются из valueHigh/valueLow при сохранении
+    systolic_value = models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Систолическое АД')
+    diastolic_value = models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Диастолическое АД')
     hr_value = models.PositiveIntegerField(blank=True, null=True)
     temperature_value = models.DecimalField(max_digits=4, decimal_places=1, blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # ID показания, присвоенный монитором; уникален в пределах поступления,
+    # по нему повторная отправка пакета не создаёт дублей
+    client_reading_id = models.CharField(max_length=64, blank=True, null=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        # Строковые поля - источник истины: очищенное давление очищает и число
+        self.systolic_value = parse_pressure(self.valueHigh)
+        self.diastolic_value = parse_pressure(self.valueLow)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['admission', 'created_at'], name='healthnote_admission_time_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['admission', 'client_reading_id'],
+                condition=models.Q(client_reading_id__isnull=False),
+                name='healthnote_client_reading_uniq'
+            ),
+        ]
+
+
+class PatientSearchIndex(models.Model):
+    patient = models.OneToOneField(
+        Patient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry'
+    )
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='+')
+    last_name = models.CharField(max_length=50)
+    first_name = models.CharField(max_length=50)
+    middle_name = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', 'last_name'], name='psearch_hospital_last_idx'),
+            models.Index(fields=['hospital', 'first_name'], name='psearch_hospital_first_idx'),
+            models.Index(fields=['hospital', 'middle_name'], name='psearch_hospital_middle_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.last_name} {self.first_name} {self.middle_name}"
+
+
+class DepartmentCensus(models.Model):
+    admission = models.OneToOneField(
+        Admission,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='census_entry'
+    )
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='census')
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='census_entries')
+    room_number = models.CharField(max_length=10, verbose_name='Номер палаты')
+    admission_date = models.DateTimeField(verbose_name='Дата поступления')
+
+    class Meta:
+        ordering = ['room_number', 'admission_date']
+        indexes = [
+            models.Index(fields=['department', 'room_number', 'admission_date'], name='census_department_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.department} - {self.room_number}: {self.patient_id}"
+
+
+class Mkb10Code(models.Model):
+    code = models.CharField(max_length=16, unique=True, verbose_name='Код МКБ-10')
+    name = models.CharField(max_length=500, verbose_name='Наименование')
+
+    class Meta:
+        ordering = ['code']
+        verbose_name = 'Диагноз МКБ-10'
+        verbose_name_plural = 'Справочник МКБ-10'
+
+    def __str__(self):
+        return f"{self.code} {self.name}"
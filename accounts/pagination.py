@@ -0,0 +1,125 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q, QuerySet
+from django.utils.functional import cached_property
+
+
+def encode_cursor(*values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+# Курсорная пагинация по убыванию (field, pk), NULL в field идут последними.
+# Стоимость страницы не зависит от её номера: один запрос с LIMIT page_size + 1.
+def paginate_keyset(queryset, field, cursor, page_size):
+    model_field = queryset.model._meta.get_field(field)
+    # Для NOT NULL полей обходимся без NULLS LAST и ветки IS NULL,
+    # чтобы порядок и границу страницы давал индекс, а не сортировка
+    if model_field.null:
+        queryset = queryset.order_by(F(field).desc(nulls_last=True), '-pk')
+    else:
+        queryset = queryset.order_by(F(field).desc(), '-pk')
+
+    values = decode_cursor(cursor)
+    if values and len(values) == 2:
+        try:
+            value = model_field.to_python(values[0])
+            pk = int(values[1])
+        except (ValidationError, TypeError, ValueError):
+            value, pk = None, None
+        if pk is not None:
+            if value is None:
+                queryset = queryset.filter(**{f'{field}__isnull': True, 'pk__lt': pk})
+            else:
+                # field <= value задаёт диапазон по индексу, остальное - уточнение внутри него
+                after = Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(pk__lt=pk))
+                if model_field.null:
+                    after |= Q(**{f'{field}__isnull': True})
+                queryset = queryset.filter(after)
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(items, next_cursor)
+
+
+class CappedCount(int):
+    # Число строк, дальше которого не считали; в шаблонах выводится как «10000+»
+    def __str__(self):
+        return f'{int(self)}+'
+
+
+class ApproximateCountPaginator(Paginator):
+    # Точный COUNT(*) по большим таблицам дорог, поэтому считаем не дальше
+    # exact_count_limit строк. Ограничено только показываемое число: страницы
+    # за пределом открываются, пустой оказывается лишь страница за концом данных.
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        count = queryset.order_by()[:self.exact_count_limit + 1].count()
+        if count > self.exact_count_limit:
+            return CappedCount(self.exact_count_limit)
+        return count
+
+    def validate_number(self, number):
+        if not isinstance(self.count, CappedCount):
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        if not isinstance(self.count, CappedCount):
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page])
+        if not items and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return self._get_page(items, number, self)
@@ -0,0 +1,83 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates
+
+# Профиль текущего запроса; None, когда профилирование выключено
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_time = 0.0
+        self.queries = []
+        self.template_time = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def add_template_time(self, seconds):
+        self.template_time = (self.template_time or 0.0) + seconds
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+        return self
+
+    @property
+    def query_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def slowest(self, limit=3):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+    def duplicated(self, limit=5):
+        # Одинаковый SQL с разными параметрами - обычно признак N+1
+        counts = Counter(sql for sql, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common(limit) if count > 1]
+
+    def server_timing(self, view_name):
+        metrics = [
+            f'sql;dur={self.query_time * 1000:.1f};desc="{len(self.queries)} queries"',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ]
+        if self.template_time is not None:
+            # Включает и запросы ленивых queryset, выполненные во время рендера
+            metrics.insert(1, f'tpl;dur={self.template_time * 1000:.1f}')
+        if view_name:
+            metrics.append(f'view;desc="{view_name}"')
+        return ', '.join(metrics)
+
+
+class ProfilingTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        if profile is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.add_template_time(time.perf_counter() - started)
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    # Подключается в TEMPLATES только при REQUEST_PROFILING; вложенные
+    # {% include %} не проходят через бэкенд, поэтому время не считается дважды
+
+    def from_string(self, template_code):
+        return ProfilingTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfilingTemplate(super().get_template(template_name))
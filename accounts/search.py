@@ -0,0 +1,113 @@
+import re
+
+from django.db.models import Case, IntegerField, Q, Value, When
+from transliterate import translit
+
+from .models import Patient, PatientSearchIndex
+
+LATIN_RE = re.compile(r'[a-z]')
+CYRILLIC_RE = re.compile(r'[а-я]')
+NON_NAME_RE = re.compile(r'[^0-9a-zа-я\- ]')
+
+# Верхняя граница для диапазонного поиска по префиксу: префикс <= x < префикс + U+FFFF
+PREFIX_SENTINEL = '\uffff'
+NAME_FIELDS = ('last_name', 'first_name', 'middle_name')
+# Вес совпадения токена с полем: точное вдвое весомее префикса, фамилия весомее
+# имени, имя - отчества. По убыванию веса, чтобы CASE выбирал лучшее совпадение
+TOKEN_WEIGHTS = (
+    (6, 'last_name', True), (4, 'first_name', True), (3, 'last_name', False),
+    (2, 'middle_name', True), (2, 'first_name', False), (1, 'middle_name', False),
+)
+
+
+def normalize_name(value):
+    # SQLite не умеет приводить кириллицу к нижнему регистру, поэтому храним
+    # и ищем уже нормализованные строки: casefold, ё -> е, латиница -> кириллица
+    value = (value or '').strip().casefold().replace('ё', 'е')
+    if LATIN_RE.search(value) and not CYRILLIC_RE.search(value):
+        try:
+            value = translit(value, 'ru').casefold().replace('ё', 'е')
+        except Exception:
+            pass
+    value = NON_NAME_RE.sub('', value)
+    return ' '.join(value.split())
+
+
+def build_search_entry(patient):
+    return PatientSearchIndex(
+        patient_id=patient.pk,
+        hospital_id=patient.hospital_id,
+        last_name=normalize_name(patient.last_name),
+        first_name=normalize_name(patient.first_name),
+        middle_name=normalize_name(patient.middle_name),
+    )
+
+
+def index_patient(patient):
+    entry = build_search_entry(patient)
+    PatientSearchIndex.objects.update_or_create(
+        patient_id=patient.pk,
+        defaults={
+            'hospital_id': entry.hospital_id,
+            'last_name': entry.last_name,
+            'first_name': entry.first_name,
+            'middle_name': entry.middle_name,
+        }
+    )
+
+
+def prefix_lookup(field, value):
+    return {f'{field}__gte': value, f'{field}__lt': value + PREFIX_SENTINEL}
+
+
+def search_patient_ids(hospital, last_name='', first_name='', middle_name=''):
+    lookups = {}
+    for field, value in (('last_name', last_name), ('first_name', first_name), ('middle_name', middle_name)):
+        value = normalize_name(value)
+        if value:
+            lookups.update(prefix_lookup(field, value))
+    return PatientSearchIndex.objects.filter(hospital=hospital, **lookups).values('patient_id')
+
+
+def search_patients(hospital, **names):
+    return Patient.objects.filter(hospital=hospital, id__in=search_patient_ids(hospital, **names))
+
+
+def _token_score(token):
+    return Case(
+        *[When(Q(**{field: token}) if exact else Q(**prefix_lookup(field, token)), then=Value(weight))
+          for weight, field, exact in TOKEN_WEIGHTS],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _token_filter(token):
+    condition = Q()
+    for field in NAME_FIELDS:
+        condition |= Q(**prefix_lookup(field, token))
+    return condition
+
+
+def typeahead(hospital, query, limit=10):
+    tokens = normalize_name(query).split()
+    if not tokens:
+        return []
+
+    # Кандидатов берём диапазонными сканами индексов по самому длинному токену;
+    # остальные токены фильтруются и все ранжируются в том же запросе, поэтому
+    # в срез попадают лучшие совпадения, а не первые попавшиеся строки.
+    # Ранг у записи один и тот же, какое бы поле её ни нашло, так что лучшие
+    # limit из объединения трёх выборок - это лучшие limit вообще
+    anchor = max(tokens, key=len)
+    score = sum((_token_score(token) for token in tokens[1:]), _token_score(tokens[0]))
+    candidates = {}
+    for field in NAME_FIELDS:
+        rows = PatientSearchIndex.objects.filter(
+            *[_token_filter(token) for token in tokens], hospital=hospital, **prefix_lookup(field, anchor)
+        ).annotate(score=score).order_by('-score', 'last_name', 'first_name', 'pk').select_related('patient')[:limit]
+        for entry in rows:
+            candidates[entry.pk] = entry
+
+    ranked = sorted(candidates.values(), key=lambda entry: (-entry.score, entry.last_name, entry.first_name, entry.pk))
+    return [entry.patient for entry in ranked[:limit]]
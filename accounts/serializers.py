@@ -0,0 +1,56 @@
+from rest_framework import serializers
+
+from .models import Admission, HealthNote, Patient
+
+
+class SparseFieldsetSerializer(serializers.ModelSerializer):
+    # fields - подмножество Meta.fields, запрошенное через ?fields=
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class AdmissionBriefSerializer(serializers.ModelSerializer):
+    department_code = serializers.CharField(source='department.code', read_only=True)
+
+    class Meta:
+        model = Admission
+        fields = ['id', 'admission_date', 'discharge_date', 'department', 'department_code', 'room_number']
+        read_only_fields = fields
+
+
+class PatientSerializer(SparseFieldsetSerializer):
+    admissions = AdmissionBriefSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Patient
+        fields = [
+            'id', 'last_name', 'first_name', 'middle_name', 'birth_date', 'gender', 'snils', 'height', 'weight',
+            'is_hospitalized', 'last_admission_date', 'admissions',
+        ]
+        read_only_fields = fields
+
+
+class AdmissionSerializer(SparseFieldsetSerializer):
+    patient_name = serializers.CharField(source='patient', read_only=True)
+    department_code = serializers.CharField(source='department.code', read_only=True)
+
+    class Meta:
+        model = Admission
+        fields = [
+            'id', 'patient', 'patient_name', 'department', 'department_code', 'room_number', 'admission_date',
+            'discharge_date', 'is_active', 'severity', 'diagnosis',
+        ]
+        read_only_fields = fields
+
+
+class HealthNoteSerializer(SparseFieldsetSerializer):
+    class Meta:
+        model = HealthNote
+        fields = [
+            'id', 'admission', 'note_type', 'created_at', 'text', 'valueHigh', 'valueLow', 'systolic_value',
+            'diastolic_value', 'hr_value', 'temperature_value',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,102 @@
+import copy
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_KEY = '_last_activity'
+DB_SYNCED_KEY = '_db_synced_at'
+# Ключи, изменение которых само по себе не требует немедленной записи в БД
+DEFERRABLE_KEYS = frozenset((ACTIVITY_KEY, DB_SYNCED_KEY))
+
+
+class SessionStore(CachedDBStore):
+    # Чтение как у cached_db: из кэша, БД только при промахе. Запись: если
+    # изменилась лишь отметка активности, сессия обновляется только в кэше,
+    # а в django_session попадает не чаще раза в SESSION_DB_WRITE_INTERVAL
+    # секунд; любые другие изменения (вход, данные) пишутся сразу.
+
+    def load(self):
+        data = super().load()
+        self._loaded = copy.deepcopy(data)
+        return data
+
+    async def aload(self):
+        data = await super().aload()
+        self._loaded = copy.deepcopy(data)
+        return data
+
+    def _activity_is_stale(self, last_activity, now):
+        return now - (last_activity or 0) >= settings.SESSION_ACTIVITY_RESOLUTION
+
+    def touch(self):
+        now = int(time.time())
+        if self._activity_is_stale(self.get(ACTIVITY_KEY), now):
+            self[ACTIVITY_KEY] = now
+
+    async def atouch(self):
+        now = int(time.time())
+        if self._activity_is_stale(await self.aget(ACTIVITY_KEY), now):
+            await self.aset(ACTIVITY_KEY, now)
+
+    def _db_write_deferrable(self, must_create):
+        loaded = getattr(self, '_loaded', None)
+        if must_create or loaded is None or self.session_key is None:
+            return False
+        current = self._session
+        keys = (current.keys() | loaded.keys()) - DEFERRABLE_KEYS
+        if any(current.get(key) != loaded.get(key) for key in keys):
+            return False
+        return time.time() - current.get(DB_SYNCED_KEY, 0) < settings.SESSION_DB_WRITE_INTERVAL
+
+    def _mark_synced(self, must_create):
+        self._get_session(no_load=must_create)[DB_SYNCED_KEY] = int(time.time())
+
+    def save(self, must_create=False):
+        if self._db_write_deferrable(must_create):
+            try:
+                self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+                return
+            except Exception:
+                logger.exception('Error saving to cache (%s)', self._cache)
+        self._mark_synced(must_create)
+        super().save(must_create)
+        self._loaded = copy.deepcopy(self._session)
+
+    async def asave(self, must_create=False):
+        if self._db_write_deferrable(must_create):
+            try:
+                await self._cache.aset(await self.acache_key(), self._session, await self.aget_expiry_age())
+                return
+            except Exception:
+                logger.exception('Error saving to cache (%s)', self._cache)
+        self._mark_synced(must_create)
+        await super().asave(must_create)
+        self._loaded = copy.deepcopy(self._session)
+
+    @classmethod
+    def clear_expired(cls, batch_size=None, pause=0):
+        # Удаляет пачками по короткой транзакции, чтобы не держать блокировку
+        # записи SQLite на всё время очистки (clearsessions тоже идёт сюда)
+        batch_size = batch_size or settings.SESSION_CLEANUP_BATCH_SIZE
+        Session = cls.get_model_class()
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                keys = list(
+                    Session.objects.filter(expire_date__lt=timezone.now()).values_list(
+                        'session_key', flat=True
+                    )[:batch_size]
+                )
+                if keys:
+                    Session.objects.filter(session_key__in=keys).delete()
+            deleted += len(keys)
+            if len(keys) < batch_size:
+                return deleted
+            if pause:
+                time.sleep(pause)
@@ -0,0 +1,151 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import bump_fragment_version
+from .census import sync_admission
+from .events import admission_event_data, has_vitals, publish_on_commit, vitals_event_data
+from .models import Admission, Department, DepartmentCensus, HealthNote, Hospital, Patient
+from .search import index_patient
+
+
+@receiver(post_save, sender=Patient)
+def update_patient_search_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_patient(instance)
+
+
+@receiver(post_save, sender=Admission)
+@receiver(post_delete, sender=Admission)
+def update_patient_admission_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    Patient.refresh_admission_summary(instance.patient_id)
+
+
+@receiver(post_save, sender=Admission)
+def update_department_census(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync_admission(instance)
+
+
+@receiver(post_save, sender=Admission)
+def bump_admission_content_version(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    Admission.bump_content_version(pk=instance.pk)
+
+
+@receiver(post_save, sender=Patient)
+def bump_patient_admissions_content_version(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    Admission.bump_content_version(patient_id=instance.pk)
+
+
+@receiver(post_save, sender=Department)
+def bump_department_admissions_content_version(sender, instance, created, raw=False, **kwargs):
+    # Названия больницы и отделения печатаются в шапке истории болезни
+    if raw or created:
+        return
+    Admission.bump_content_version(department_id=instance.pk)
+
+
+@receiver(post_save, sender=Hospital)
+def bump_hospital_admissions_content_version(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    Admission.bump_content_version(patient__hospital_id=instance.pk)
+
+
+@receiver(post_save, sender=HealthNote)
+@receiver(post_delete, sender=HealthNote)
+def bump_note_admission_content_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    Admission.bump_content_version(pk=instance.admission_id)
+
+
+@receiver(pre_save, sender=Admission)
+def remember_admission_department(sender, instance, raw=False, **kwargs):
+    # При переводе в другое отделение сбросить нужно и прежнее, а табло
+    # отделений получают события о выписке, переводе и смене палаты
+    if raw or instance.pk is None:
+        return
+    previous = Admission.objects.filter(pk=instance.pk).values_list(
+        'department_id', 'room_number', 'discharge_date'
+    ).first()
+    instance._previous_department_id = previous[0] if previous else None
+    instance._previous_state = previous
+
+
+@receiver(post_save, sender=Admission)
+@receiver(post_delete, sender=Admission)
+def invalidate_admission_fragments(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_department_id', None)
+    bump_fragment_version('department', *filter(None, (instance.department_id, previous)))
+
+
+@receiver(post_save, sender=Patient)
+def invalidate_patient_fragments(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    department_ids = DepartmentCensus.objects.filter(patient=instance).values_list('department_id', flat=True)
+    bump_fragment_version('department', *department_ids)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_department_fragments(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_fragment_version('hospital', instance.hospital_id)
+    bump_fragment_version('department', instance.pk)
+
+
+@receiver(post_save, sender=Hospital)
+def invalidate_hospital_fragments(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_fragment_version('hospital', instance.pk)
+
+
+@receiver(post_save, sender=Admission)
+def publish_admission_events(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_state', None)
+    was_active = previous is not None and previous[2] is None
+    if instance.discharge_date is not None:
+        if was_active:
+            publish_on_commit(previous[0], 'discharge', {'admission_id': instance.pk})
+        return
+    if was_active and previous[0] != instance.department_id:
+        publish_on_commit(previous[0], 'discharge', {'admission_id': instance.pk})
+    elif was_active:
+        if previous[1] != instance.room_number:
+            publish_on_commit(instance.department_id, 'room', {
+                'admission_id': instance.pk, 'room_number': instance.room_number
+            })
+        return
+    publish_on_commit(instance.department_id, 'admission', admission_event_data(instance))
+
+
+@receiver(post_delete, sender=Admission)
+def publish_admission_delete(sender, instance, **kwargs):
+    if instance.discharge_date is None:
+        publish_on_commit(instance.department_id, 'discharge', {'admission_id': instance.pk})
+
+
+@receiver(post_save, sender=HealthNote)
+def publish_vitals(sender, instance, created, raw=False, **kwargs):
+    if raw or not created or not has_vitals(instance):
+        return
+    department_id = Admission.objects.filter(pk=instance.admission_id, discharge_date__isnull=True).values_list(
+        'department_id', flat=True
+    ).first()
+    if department_id is not None:
+        publish_on_commit(department_id, 'vitals', vitals_event_data(instance))
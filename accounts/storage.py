@@ -0,0 +1,67 @@
+import gzip
+from functools import lru_cache
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+
+try:
+    import brotli
+except ImportError:  # brotli указан в requirements.txt; без него создаются только .gz
+    brotli = None
+
+# Уже сжатые форматы (woff/woff2, png, jpg) повторно не сжимаются
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.map', '.svg', '.ttf', '.eot', '.json', '.txt', '.ico', '.html'}
+# Сжатая копия сохраняется, только если она заметно меньше исходника
+MIN_COMPRESSION_RATIO = 0.95
+
+
+def compress_file(path):
+    data = path.read_bytes()
+    written = []
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+    for suffix, compress in variants:
+        compressed = compress()
+        if len(compressed) < len(data) * MIN_COMPRESSION_RATIO:
+            target = path.with_name(path.name + suffix)
+            target.write_bytes(compressed)
+            written.append(target)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Имена с хешем содержимого + заранее сжатые .gz/.br копии, которые
+    # отдаёт static_asset_view без сжатия на лету
+
+    def stored_name(self, name):
+        # До collectstatic (тесты, разработка) манифеста нет - отдаём исходное имя
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+        if dry_run:
+            return
+        for hashed_name in sorted(hashed_names):
+            path = Path(self.path(hashed_name))
+            if path.suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+                compress_file(path)
+
+
+@lru_cache(maxsize=4)
+def _hashed_names(manifest_hash):
+    return frozenset(staticfiles_storage.hashed_files.values())
+
+
+def is_hashed_name(name):
+    # Имена из манифеста содержат хеш содержимого и никогда не меняются
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+    if not hashed_files:
+        return False
+    return name in _hashed_names(staticfiles_storage.manifest_hash)
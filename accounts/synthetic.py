@@ -0,0 +1,257 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .census import build_census_entry
+from .models import (
+    Admission, CustomUser, Department, DepartmentCensus, HealthNote, Hospital, Patient, PatientSearchIndex
+)
+from .search import build_search_entry
+
+# Фамилии в мужской форме; женская получается добавлением "а"
+LAST_NAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров',
+    'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров', 'Павлов', 'Козлов', 'Степанов', 'Николаев',
+    'Орлов', 'Андреев', 'Макаров', 'Никитин', 'Захаров', 'Зайцев', 'Соловьёв', 'Борисов', 'Яковлев', 'Григорьев',
+)
+MALE_NAMES = ('Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Иван', 'Михаил', 'Николай', 'Павел')
+FEMALE_NAMES = ('Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Татьяна', 'Ирина', 'Светлана', 'Екатерина', 'Юлия')
+PATRONYMIC_ROOTS = ('Александров', 'Дмитриев', 'Сергеев', 'Андреев', 'Алексеев', 'Иванов', 'Михайлов', 'Петров')
+DEPARTMENT_NAMES = (
+    'Терапия', 'Кардиология', 'Неврология', 'Хирургия', 'Пульмонология', 'Гастроэнтерология', 'Эндокринология',
+    'Травматология', 'Урология', 'Реанимация',
+)
+POSITIONS = ('Врач', 'Врач', 'Медсестра', 'Медсестра', 'Медсестра', 'Заведующий отделением')
+DIAGNOSES = (
+    'I10 Эссенциальная гипертензия', 'I20.8 Стабильная стенокардия', 'J18.9 Пневмония неуточнённая',
+    'J44.1 ХОБЛ с обострением', 'E11.9 Сахарный диабет 2 типа', 'K29.7 Гастрит неуточнённый',
+    'I63.9 Инфаркт мозга неуточнённый', 'N10 Острый пиелонефрит', 'K80.2 Желчнокаменная болезнь',
+    'S72.0 Перелом шейки бедра',
+)
+# Доли пациентов с одной, двумя и тремя госпитализациями за период
+ADMISSIONS_PER_PATIENT = ((1, 0.6), (2, 0.3), (3, 0.1))
+STAY_DAYS = (3, 21)
+ROOMS_PER_DEPARTMENT = 30
+
+
+@contextmanager
+def throwaway_database(path):
+    # Отдельный файл SQLite вместо рабочей базы: замеры не пишут в неё и не держат
+    # её блокировку записи. Файл, а не база в памяти, - чтобы был рабочий профиль SQLite
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    old_name = connection.settings_dict['NAME']
+    test_settings['NAME'] = str(path)
+    try:
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        test_settings['NAME'] = old_test_name
+
+
+def make_snils(number):
+    # number - девятизначный номер больше 001-001-998, к нему дописывается контрольная сумма
+    digits = f'{number:09d}'
+    total = sum(int(digit) * (9 - i) for i, digit in enumerate(digits))
+    if total > 101:
+        total %= 101
+    return f'{digits}{0 if total in (100, 101) else total:02d}'
+
+
+def _person(rng, gender):
+    last_name = rng.choice(LAST_NAMES)
+    root = rng.choice(PATRONYMIC_ROOTS)
+    if gender == 'M':
+        return last_name, rng.choice(MALE_NAMES), f'{root}ич'
+    return f'{last_name}а', rng.choice(FEMALE_NAMES), f'{root}на'
+
+
+def _vitals(rng, admission, moment):
+    fever = rng.random() < 0.15
+    systolic = int(rng.gauss(128, 15))
+    diastolic = int(rng.gauss(82, 9))
+    return HealthNote(
+        admission_id=admission.pk,
+        note_type='info',
+        created_at=moment + timedelta(minutes=rng.randint(-20, 20)),
+        hr_value=max(40, int(rng.gauss(78, 11))),
+        temperature_value=Decimal(str(round(rng.gauss(38.2 if fever else 36.7, 0.3), 1))),
+        valueHigh=str(systolic),
+        valueLow=str(diastolic),
+        systolic_value=systolic,
+        diastolic_value=diastolic,
+    )
+
+
+class SyntheticHospitalGenerator:
+    # Пишет только пачками через bulk_create и сам заполняет производные
+    # таблицы (поисковый индекс, перепись, сводку госпитализаций), т.к. сигналы не срабатывают
+
+    def __init__(self, hospitals=1, departments=5, staff=20, patients=500, months=3, vitals_per_day=4,
+                 seed=1, batch_size=2000, password='synthetic-pass', progress=None):
+        self.hospitals = hospitals
+        self.departments = departments
+        self.staff = staff
+        self.patients = patients
+        self.months = months
+        self.vitals_per_day = vitals_per_day
+        self.batch_size = batch_size
+        self.password = password
+        self.progress = progress
+        self.rng = random.Random(seed)
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        self.period_start = self.now - timedelta(days=30 * months)
+        self.counts = dict.fromkeys(('hospitals', 'departments', 'staff', 'patients', 'admissions', 'notes'), 0)
+
+    def run(self):
+        password_hash = make_password(self.password)
+        start = Hospital.objects.aggregate(last=Max('id'))['last'] or 0
+        for number in range(start + 1, start + self.hospitals + 1):
+            with transaction.atomic():
+                hospital = Hospital.objects.create(
+                    name=f'Синтетическая больница №{number}',
+                    address=f'ул. Тестовая, {number}'
+                )
+                departments = Department.objects.bulk_create([
+                    Department(
+                        hospital=hospital,
+                        name=DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)],
+                        code=f'S{number}-{i + 1}'
+                    )
+                    for i in range(self.departments)
+                ])
+                self.create_staff(hospital, departments, password_hash)
+                self.counts['hospitals'] += 1
+                self.counts['departments'] += len(departments)
+            for offset in range(0, self.patients, self.batch_size):
+                with transaction.atomic():
+                    self.create_patients(hospital, departments, offset, min(self.batch_size, self.patients - offset))
+                if self.progress:
+                    self.progress(self.counts)
+        return self.counts
+
+    def create_staff(self, hospital, departments, password_hash):
+        last = CustomUser.objects.filter(
+            employee_number__regex=r'^7\d{9}$'
+        ).aggregate(last=Max('employee_number'))['last']
+        first_number = int(last) + 1 if last else 7000000000
+        users = []
+        for i in range(self.staff):
+            gender = self.rng.choice('MF')
+            number = str(first_number + i)
+            users.append(CustomUser(
+                username=f'synthetic_{number}',
+                employee_number=number,
+                full_name=' '.join(_person(self.rng, gender)),
+                position=self.rng.choice(POSITIONS),
+                phone_number=f'+7900{number[-7:]}',
+                hospital=hospital,
+                password=password_hash,
+            ))
+        CustomUser.objects.bulk_create(users, batch_size=self.batch_size)
+        Through = CustomUser.departments.through
+        Through.objects.bulk_create([
+            Through(customuser_id=user.pk, department_id=department.pk)
+            for i, user in enumerate(users)
+            for department in {departments[i % len(departments)], self.rng.choice(departments)}
+        ], batch_size=self.batch_size)
+        self.counts['staff'] += len(users)
+
+    def plan_admissions(self, departments):
+        counts, weights = zip(*ADMISSIONS_PER_PATIENT)
+        stays = []
+        moment = self.period_start + timedelta(hours=self.rng.randint(0, 24 * 30 * self.months))
+        for _ in range(self.rng.choices(counts, weights)[0]):
+            if moment >= self.now:
+                break
+            discharge = moment + timedelta(days=self.rng.randint(*STAY_DAYS), hours=self.rng.randint(0, 23))
+            stays.append(Admission(
+                department=self.rng.choice(departments),
+                room_number=str(self.rng.randint(1, ROOMS_PER_DEPARTMENT)),
+                admission_date=moment,
+                discharge_date=discharge if discharge < self.now else None,
+                diagnosis=self.rng.choice(DIAGNOSES),
+                severity=self.rng.choice(Admission.SEVERITY_CHOICES)[0],
+                mind='clear',
+                movement='active',
+            ))
+            if discharge >= self.now:
+                break
+            moment = discharge + timedelta(days=self.rng.randint(7, 60))
+        return stays
+
+    def create_patients(self, hospital, departments, offset, count):
+        patients, plans = [], []
+        for i in range(offset, offset + count):
+            gender = self.rng.choice('MF')
+            last_name, first_name, middle_name = _person(self.rng, gender)
+            stays = self.plan_admissions(departments)
+            patients.append(Patient(
+                hospital=hospital,
+                last_name=last_name,
+                first_name=first_name,
+                middle_name=middle_name,
+                birth_date=(self.now - timedelta(days=self.rng.randint(18 * 365, 90 * 365))).date(),
+                birth_place='г. Москва',
+                snils=make_snils(2000000 + i),
+                gender=gender,
+                height=self.rng.randint(150, 195),
+                weight=self.rng.randint(45, 120),
+                last_admission_date=max((stay.admission_date for stay in stays), default=None),
+                is_hospitalized=any(stay.discharge_date is None for stay in stays),
+            ))
+            plans.append(stays)
+
+        Patient.objects.bulk_create(patients)
+        PatientSearchIndex.objects.bulk_create([build_search_entry(patient) for patient in patients])
+        admissions = []
+        for patient, stays in zip(patients, plans):
+            for stay in stays:
+                stay.patient_id = patient.pk
+                admissions.append(stay)
+        Admission.objects.bulk_create(admissions, batch_size=self.batch_size)
+        DepartmentCensus.objects.bulk_create(
+            [build_census_entry(admission) for admission in admissions if admission.discharge_date is None],
+            batch_size=self.batch_size
+        )
+        self.counts['patients'] += len(patients)
+        self.counts['admissions'] += len(admissions)
+        self.create_notes(admissions)
+
+    def create_notes(self, admissions):
+        step = timedelta(hours=24 / self.vitals_per_day)
+        notes = []
+        for admission in admissions:
+            end = admission.discharge_date or self.now
+            moment = admission.admission_date + step
+            day = 0
+            while moment < end:
+                notes.append(_vitals(self.rng, admission, moment))
+                day += 1
+                if day % self.vitals_per_day == 0:
+                    notes.append(HealthNote(
+                        admission_id=admission.pk,
+                        note_type=self.rng.choice(('note', 'prescription', 'research')),
+                        created_at=moment,
+                        text='Состояние стабильное, жалоб активно не предъявляет. Назначения выполняются.',
+                    ))
+                moment += step
+                if len(notes) >= self.batch_size:
+                    HealthNote.objects.bulk_create(notes)
+                    self.counts['notes'] += len(notes)
+                    notes = []
+        HealthNote.objects.bulk_create(notes)
+        self.counts['notes'] += len(notes)
+
+
+def generate(**options):
+    return SyntheticHospitalGenerator(**options).run()
@@ -0,0 +1,10 @@
+from django import template
+
+from accounts.assets import vendor_asset_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor_asset(name):
+    return vendor_asset_url(name)
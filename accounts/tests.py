@@ -1,3 +1,1533 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import json
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+import brotli
+from django.contrib import admin
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import Permission
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.management.base import SystemCheckError
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.utils import ConnectionHandler
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import events, ingest, mkb10
+from .assets import VENDOR_ASSETS, VENDOR_LOCK_FILE, is_vendored, vendor_asset_url
+from .caching import bump_fragment_version, fragment_version_key, get_fragment_version
+from .api import PatientViewSet
+from .census import find_census_errors
+from .events import DepartmentBroker
+from .checks import check_single_process_events, check_sqlite_pragmas, check_vendor_assets, sqlite_pragma_mismatches
+from .gigdata import CircuitOpenError, GigdataClient, GigdataError
+from .importers import import_patients, import_staff, normalize_snils_batch, snils_checksum_valid
+from .management.commands.bench_views import Command as BenchViewsCommand
+from .models import (
+    Admission, CustomUser, Department, DepartmentCensus, HealthNote, Hospital, Patient, PatientSearchIndex
+)
+from .pagination import ApproximateCountPaginator
+from .profiling import RequestProfile
+from .vitals import bucketize, downsample
+from .search import normalize_name, search_patients, typeahead
+from .sessions import ACTIVITY_KEY, SessionStore
+from .synthetic import generate, make_snils
+
+
+class HospitalTestMixin:
+    snils_counter = 10000000000
+
+    def setUp(self):
+        cache.clear()
+        self.hospital = Hospital.objects.create(name='Городская больница', address='ул. Ленина, 1')
+        self.department = Department.objects.create(hospital=self.hospital, name='Терапия', code='T1')
+        self.user = CustomUser(
+            employee_number='1001',
+            full_name='Петров Пётр Петрович',
+            position='Врач',
+            phone_number='+79990000000',
+            hospital=self.hospital,
+        )
+        self.user.set_password('secret-pass')
+        self.user.save()
+        self.user.departments.add(self.department)
+        self.client.force_login(self.user)
+
+    def create_patient(self, last_name='Иванов', first_name='Иван', middle_name='Иванович', **kwargs):
+        HospitalTestMixin.snils_counter += 1
+        data = {
+            'hospital': self.hospital,
+            'birth_date': date(1980, 1, 1),
+            'snils': str(HospitalTestMixin.snils_counter),
+            'gender': 'M',
+            'height': 180,
+            'weight': 80,
+        }
+        data.update(kwargs)
+        return Patient.objects.create(last_name=last_name, first_name=first_name, middle_name=middle_name, **data)
+
+
+class PatientSearchTests(HospitalTestMixin, TestCase):
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name('  Семёнов '), 'семенов')
+        self.assertEqual(normalize_name('Ivanov'), 'иванов')
+
+    def test_index_follows_save_and_delete(self):
+        patient = self.create_patient()
+        self.assertEqual(PatientSearchIndex.objects.get(pk=patient.pk).last_name, 'иванов')
+        patient.last_name = 'Сидоров'
+        patient.save()
+        self.assertEqual(PatientSearchIndex.objects.get(pk=patient.pk).last_name, 'сидоров')
+        patient.delete()
+        self.assertFalse(PatientSearchIndex.objects.exists())
+
+    def test_search_is_case_insensitive_and_scoped(self):
+        patient = self.create_patient(last_name='Ёлкин')
+        other = Hospital.objects.create(name='Другая', address='-')
+        self.create_patient(last_name='Ёлкин', hospital=other)
+        found = list(search_patients(self.hospital, last_name='елк'))
+        self.assertEqual(found, [patient])
+
+    def test_typeahead_ranks_exact_matches_first(self):
+        prefix = self.create_patient(last_name='Иванова', first_name='Мария')
+        exact = self.create_patient(last_name='Иванов', first_name='Пётр')
+        self.assertEqual(typeahead(self.hospital, 'иванов'), [exact, prefix])
+        self.assertEqual(typeahead(self.hospital, 'ivanov petr'), [exact])
+
+    def test_typeahead_keeps_best_matches_beyond_limit(self):
+        for i in range(5):
+            self.create_patient(last_name='Иванова', first_name=f'Мария{i}', middle_name='Петровна')
+        exact = self.create_patient(last_name='Иванов', first_name='Пётр', middle_name='Ильич')
+        with self.assertNumQueries(3):
+            self.assertEqual(typeahead(self.hospital, 'иванов', limit=2)[0], exact)
+        self.assertEqual(typeahead(self.hospital, 'иванов петр', limit=1), [exact])
+        self.assertEqual(typeahead(self.hospital, 'мария3 иванов', limit=1)[0].first_name, 'Мария3')
+
+        with CaptureQueriesContext(connection) as queries:
+            typeahead(self.hospital, 'иванов петр')
+        with connection.cursor() as cursor:
+            for query in queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertIn('SEARCH accounts_patientsearchindex USING INDEX psearch_hospital_', plan)
+
+    def test_typeahead_endpoint(self):
+        patient = self.create_patient()
+        response = self.client.get(reverse('patient_search'), {'q': 'ИВАН'})
+        self.assertEqual(response.json()['results'][0]['id'], patient.id)
+
+    def test_rebuild_command(self):
+        patient = self.create_patient()
+        PatientSearchIndex.objects.all().delete()
+        call_command('rebuild_patient_search_index', stdout=StringIO())
+        self.assertTrue(PatientSearchIndex.objects.filter(pk=patient.pk).exists())
+
+
+class PatientRegistryTests(HospitalTestMixin, TestCase):
+    def admit(self, patient, **kwargs):
+        return Admission.objects.create(
+            patient=patient, department=self.department, room_number='101', diagnosis='J18', **kwargs
+        )
+
+    def test_admission_summary_is_denormalized(self):
+        patient = self.create_patient()
+        admission = self.admit(patient)
+        patient.refresh_from_db()
+        self.assertTrue(patient.is_hospitalized)
+        self.assertEqual(patient.last_admission_date, admission.admission_date)
+
+        admission.discharge_date = timezone.now()
+        admission.save()
+        patient.refresh_from_db()
+        self.assertFalse(patient.is_hospitalized)
+
+    def test_registry_keyset_pages(self):
+        now = timezone.now()
+        patients = [self.create_patient(last_name=f'Пациент{i}') for i in range(5)]
+        for i, patient in enumerate(patients[:3]):
+            self.admit(patient, admission_date=now - timedelta(days=i))
+
+        seen = []
+        params = {'last_name': '', 'cursor': ''}
+        for _ in range(5):
+            with patch('accounts.views.PATIENTS_PAGE_SIZE', 2):
+                response = self.client.get(reverse('patients'), params)
+            seen.extend(p.id for p in response.context['patients'])
+            if not response.context['next_url']:
+                break
+            params['cursor'] = response.context['patients'].next_cursor
+        expected = [p.id for p in patients[:3]] + sorted((p.id for p in patients[3:]), reverse=True)
+        self.assertEqual(seen, expected)
+
+    def test_registry_page_query_count_is_constant(self):
+        for i in range(30):
+            self.admit(self.create_patient(last_name=f'Пациент{i}'))
+        self.client.get(reverse('patients'), {'last_name': ''})
+        with self.assertNumQueries(3):
+            self.client.get(reverse('patients'), {'last_name': ''})
+
+    def test_rebuild_registry_command(self):
+        patient = self.create_patient()
+        self.admit(patient)
+        Patient.objects.update(is_hospitalized=False, last_admission_date=None)
+        call_command('rebuild_patient_registry', stdout=StringIO())
+        patient.refresh_from_db()
+        self.assertTrue(patient.is_hospitalized)
+        self.assertIsNotNone(patient.last_admission_date)
+
+
+class DepartmentCensusTests(HospitalTestMixin, TestCase):
+    def admit(self, patient, room_number='101', **kwargs):
+        return Admission.objects.create(
+            patient=patient, department=self.department, room_number=room_number, diagnosis='J18', **kwargs
+        )
+
+    def test_census_follows_admission_lifecycle(self):
+        admission = self.admit(self.create_patient())
+        self.assertEqual(DepartmentCensus.objects.get(pk=admission.pk).room_number, '101')
+
+        admission.room_number = '202'
+        admission.save()
+        self.assertEqual(DepartmentCensus.objects.get(pk=admission.pk).room_number, '202')
+
+        self.client.post(reverse('discharge_patient', args=[admission.id]))
+        self.assertFalse(DepartmentCensus.objects.exists())
+
+    def test_department_view_query_count_is_constant(self):
+        for i in range(20):
+            self.admit(self.create_patient(last_name=f'Пациент{i}'), room_number=str(i))
+        url = reverse('department', args=[self.department.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_fragment_version('department', self.department.id)
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertContains(response, 'Палата: 19')
+
+    def test_check_command_repairs_census(self):
+        admission = self.admit(self.create_patient())
+        DepartmentCensus.objects.all().delete()
+        self.assertEqual(find_census_errors()['missing'], [admission.pk])
+        with self.assertRaises(CommandError):
+            call_command('check_department_census', stdout=StringIO())
+        call_command('check_department_census', '--fix', stdout=StringIO())
+        self.assertFalse(any(find_census_errors().values()))
+
+
+class AdminChangelistTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.is_superuser = True
+        self.user.save()
+
+    def add_rows(self, count):
+        for _ in range(count):
+            patient = self.create_patient()
+            admission = Admission.objects.create(
+                patient=patient, department=self.department, room_number='1', diagnosis='J18'
+            )
+            HealthNote.objects.create(admission=admission, note_type='info', hr_value=70)
+            staff = CustomUser(
+                employee_number=str(HospitalTestMixin.snils_counter)[-8:],
+                full_name=f'Сотрудник {patient.pk}',
+                hospital=self.hospital,
+            )
+            staff.save()
+            staff.departments.add(self.department)
+
+    def changelist_queries(self, model_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:accounts_{model_name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_have_fixed_query_count(self):
+        models = ['patient', 'admission', 'healthnote', 'customuser']
+        self.add_rows(2)
+        self.changelist_queries('patient')
+        small = {name: self.changelist_queries(name) for name in models}
+        self.add_rows(10)
+        large = {name: self.changelist_queries(name) for name in models}
+        self.assertEqual(small, large)
+
+    def test_approximate_paginator(self):
+        self.add_rows(3)
+        paginator = ApproximateCountPaginator(HealthNote.objects.order_by('pk'), 2)
+        self.assertEqual(paginator.count, 3)
+        with patch.object(ApproximateCountPaginator, 'exact_count_limit', 2):
+            filtered = ApproximateCountPaginator(HealthNote.objects.filter(note_type='info').order_by('pk'), 2)
+            self.assertEqual(str(filtered.count), '2+')
+
+    def test_pages_past_count_cap_open(self):
+        self.add_rows(5)
+        HealthNote.objects.filter(pk=HealthNote.objects.order_by('pk').first().pk).delete()
+        model_admin = admin.site._registry[HealthNote]
+        url = reverse('admin:accounts_healthnote_changelist')
+        with patch.object(ApproximateCountPaginator, 'exact_count_limit', 2), \
+                patch.object(model_admin, 'list_per_page', 1):
+            response = self.client.get(url, {'p': 4})
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '2+')
+            self.assertEqual(len(response.context['cl'].result_list), 1)
+            # За концом данных - обычная ошибка страницы админки
+            self.assertRedirects(self.client.get(url, {'p': 5}), f'{url}?e=1', fetch_redirect_response=False)
+
+
+class BloodPressureStorageTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='1', diagnosis='I10'
+        )
+
+    def test_save_fills_integer_columns(self):
+        note = HealthNote.objects.create(admission=self.admission, note_type='info', valueHigh='120', valueLow='8o')
+        self.assertEqual(note.systolic_value, 120)
+        self.assertIsNone(note.diastolic_value)
+
+    def test_clearing_pressure_clears_integer_columns(self):
+        note = HealthNote.objects.create(admission=self.admission, note_type='info', valueHigh='120', valueLow='80')
+        note.valueHigh, note.valueLow = '', None
+        note.save()
+        note.refresh_from_db()
+        self.assertEqual((note.systolic_value, note.diastolic_value), (None, None))
+
+    def test_backfill_converts_and_reports(self):
+        good = HealthNote.objects.create(admission=self.admission, note_type='info', valueHigh='130', valueLow='85')
+        bad = HealthNote.objects.create(admission=self.admission, note_type='info', valueHigh='abc', valueLow='90')
+        HealthNote.objects.update(systolic_value=None, diastolic_value=None)
+
+        out = StringIO()
+        call_command('backfill_blood_pressure', '--batch-size', '1', stdout=out)
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((good.systolic_value, good.diastolic_value), (130, 85))
+        self.assertEqual((bad.systolic_value, bad.diastolic_value), (None, 90))
+        self.assertIn(f'Запись {bad.pk}', out.getvalue())
+
+
+class VitalsSeriesTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='1', diagnosis='I10'
+        )
+        start = timezone.now() - timedelta(hours=10)
+        HealthNote.objects.bulk_create([
+            HealthNote(
+                admission=self.admission,
+                note_type='info',
+                created_at=start + timedelta(minutes=5 * i),
+                hr_value=60 + i % 30,
+                temperature_value=Decimal('36.6'),
+                systolic_value=120,
+                diastolic_value=80,
+            )
+            for i in range(100)
+        ])
+
+    def test_bucketize(self):
+        points = [(0, 1.0), (1000, 3.0), (60000, 5.0)]
+        self.assertEqual(bucketize(points, 60), [[0, 1.0, 3.0, 2.0], [60000, 5.0, 5.0, 5.0]])
+
+    def test_downsample_keeps_extremes(self):
+        points = [[i, 0.0] for i in range(100)]
+        points[50][1] = 100.0
+        sampled = downsample(points, 10)
+        self.assertEqual(len(sampled), 10)
+        self.assertIn([50, 100.0], sampled)
+        self.assertEqual((sampled[0], sampled[-1]), (points[0], points[-1]))
+
+    def test_series_endpoint_uses_one_notes_query(self):
+        url = reverse('analytics_series', args=[self.admission.id])
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'points': 20})
+        series = response.json()['series']
+        self.assertEqual(len(series['hr']), 20)
+        self.assertEqual(len(series['bp_high']), 20)
+
+        bucketed = self.client.get(url, {'bucket': 3600}).json()['series']
+        self.assertEqual(len(bucketed['temp'][0]), 4)
+
+    def test_series_rejects_invalid_parameters(self):
+        url = reverse('analytics_series', args=[self.admission.id])
+        for params in ({'bucket': -60}, {'bucket': 'час'}, {'from': '2024-02-30T10:00:00'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class Mkb10CatalogTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        mkb10.reset_index()
+        self.addCleanup(mkb10.reset_index)
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'mkb10.csv'
+        path.write_text(
+            'код;наименование\n'
+            'J18;Пневмония без уточнения возбудителя\n'
+            'J18.9;Пневмония неуточненная\n'
+            'I10;Эссенциальная [первичная] гипертензия\n'
+            'A09;Диарея и гастроэнтерит предположительно инфекционного происхождения\n',
+            encoding='utf-8'
+        )
+        call_command('load_mkb10', str(path), stdout=StringIO())
+
+    def test_code_prefix_search(self):
+        self.assertEqual([code for code, _ in mkb10.get_index().search('j18')], ['J18', 'J18.9'])
+        self.assertEqual([code for code, _ in mkb10.get_index().search('А09')], ['A09'])
+
+    def test_name_token_search(self):
+        found = mkb10.get_index().search('пневм неуточ')
+        self.assertEqual([code for code, _ in found], ['J18.9'])
+
+    @override_settings(GIGDATA_API_KEY=None)
+    def test_endpoint_keeps_response_shape(self):
+        response = self.client.post(reverse('mkb10_search'), {'query': 'гипертензия'})
+        suggestion = response.json()['suggestions'][0]
+        self.assertEqual(suggestion['data']['code'], 'I10')
+        self.assertEqual(suggestion['value'], 'Эссенциальная [первичная] гипертензия')
+
+
+class StubSuggestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.requests.append(body['query'])
+        time.sleep(server.delay)
+        if server.failing:
+            self.send_response(500)
+            self.end_headers()
+            return
+        payload = json.dumps({'suggestions': [{'value': body['query'], 'data': {'code': 'J18'}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubSuggestServer(ThreadingHTTPServer):
+    # Тесты таймаутов оставляют обработчики спящими в server.delay: с
+    # daemon_threads server_close не ждёт их завершения, а handle_error глушит
+    # BrokenPipe от клиента, который закрыл соединение по таймауту раньше ответа
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class GigdataClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = StubSuggestServer(('127.0.0.1', 0), StubSuggestHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.delay = 0
+        self.server.failing = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/suggest'
+
+    def make_client(self, **kwargs):
+        kwargs.setdefault('retries', 0)
+        return GigdataClient(api_key='key', url=self.url, **kwargs)
+
+    def test_normalized_queries_are_cached(self):
+        client = self.make_client()
+        client.suggest('J18')
+        client.suggest('  j18 ')
+        self.assertEqual(self.server.requests, ['J18'])
+
+    def test_concurrent_identical_queries_are_coalesced(self):
+        client = self.make_client()
+        self.server.delay = 0.3
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: client.suggest('I10'), range(8)))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_circuit_breaker_serves_stale_entries(self):
+        client = self.make_client(cache_ttl=0, failure_threshold=2, reset_timeout=60)
+        fresh = client.suggest('J18')
+        self.server.failing = True
+        self.assertEqual(client.suggest('J18'), fresh)
+        self.assertEqual(client.suggest('J18'), fresh)
+        upstream_calls = len(self.server.requests)
+
+        # автомат разомкнут: устаревший ответ отдаётся без обращения к сервису
+        self.assertEqual(client.suggest('J18'), fresh)
+        self.assertEqual(len(self.server.requests), upstream_calls)
+        with self.assertRaises(CircuitOpenError):
+            client.suggest('I10')
+
+    def test_half_open_circuit_lets_one_probe_through(self):
+        client = self.make_client(failure_threshold=1, reset_timeout=0.1)
+        self.server.failing = True
+        with self.assertRaises(GigdataError):
+            client.suggest('J18')
+        time.sleep(0.15)
+        self.server.failing = False
+        self.server.delay = 0.3
+
+        def suggest(query):
+            try:
+                return client.suggest(query)
+            except CircuitOpenError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(suggest, ['I10', 'I11', 'I12', 'I13', 'I14']))
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(sum(result is not None for result in results), 1)
+        # Проба прошла - автомат снова замкнут
+        self.server.delay = 0
+        self.assertIsNotNone(client.suggest('J45'))
+
+    def test_timeout(self):
+        client = self.make_client(timeout=(1, 0.1))
+        self.server.delay = 0.5
+        with self.assertRaises(GigdataError):
+            client.suggest('J18')
+
+
+class AuthenticationBackendTests(HospitalTestMixin, TestCase):
+    def test_login_by_employee_number_or_username(self):
+        self.assertEqual(authenticate(username='1001', password='secret-pass'), self.user)
+        self.assertEqual(authenticate(username=self.user.username, password='secret-pass'), self.user)
+
+    def test_single_query_per_attempt(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username='1001', password='wrong'))
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username='nobody', password='secret-pass'))
+
+    def test_employee_number_wins_over_username(self):
+        other = CustomUser(employee_number='2002', username='1001', full_name='Другой Сотрудник')
+        other.set_password('other-pass')
+        other.save()
+        self.assertEqual(authenticate(username='1001', password='secret-pass'), self.user)
+
+    def test_benchmark_command(self):
+        # Отдельный процесс: команда сама создаёт и удаляет свою базу, как при запуске на сервере
+        completed = subprocess.run(
+            [sys.executable, 'manage.py', 'bench_login', '--users', '5', '--logins', '20', '--fast-hasher',
+             '--skip-checks'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(completed.stdout)
+        self.assertEqual(result['unexpected_results'], 0)
+        self.assertEqual(result['queries_per_login'], 1)
+
+
+class BenchViewsTests(HospitalTestMixin, TestCase):
+    def test_sample_without_active_admission(self):
+        admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='1', diagnosis='I10',
+            discharge_date=timezone.now()
+        )
+        sample = BenchViewsCommand().pick_sample()
+        self.assertEqual(sample['admission'], admission)
+        self.assertEqual(sample['user'], self.user)
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).has_perm('accounts.export_data'))
+
+        admission.delete()
+        with self.assertRaises(CommandError):
+            BenchViewsCommand().pick_sample()
+
+
+class UserContextTests(HospitalTestMixin, TestCase):
+    def test_revoked_department_is_denied_immediately(self):
+        url = reverse('department', args=[self.department.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Как если бы доступ отозвали из другого процесса: без сигналов m2m_changed
+        CustomUser.departments.through.objects.filter(customuser=self.user).delete()
+        self.assertRedirects(self.client.get(url), reverse('home'))
+
+    def test_department_access_follows_membership(self):
+        other = Department.objects.create(hospital=self.hospital, name='Хирургия', code='S1')
+        url = reverse('department', args=[other.id])
+        self.assertRedirects(self.client.get(url), reverse('home'))
+
+        self.user.departments.add(other)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        other.customuser_set.remove(self.user)
+        self.assertRedirects(self.client.get(url), reverse('home'))
+
+    def test_home_page_queries(self):
+        for i in range(5):
+            Department.objects.create(hospital=self.hospital, name=f'Отделение {i}', code=f'D{i}')
+        self.client.get(reverse('home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_fragment_version('hospital', self.hospital.id)
+        with self.assertNumQueries(5):
+            self.client.get(reverse('home'))
+
+
+class StaffImportTests(HospitalTestMixin, TestCase):
+    CSV = (
+        'full_name;position;employee_number;phone_number;hospital;departments;password\n'
+        'Иванов Иван Иванович;Медсестра;2001;+79990000001;Городская больница;T1;\n'
+        'Иванов Иван Петрович;Медбрат;2002;+79990000002;{hospital_id};T1;pass-2002-xyz\n'
+        'Без Номера;Врач;;+79990000003;{hospital_id};;\n'
+        'Дубль Номера;Врач;1001;+79990000004;{hospital_id};;\n'
+        'Чужое Отделение;Врач;2005;+79990000005;{hospital_id};X9;\n'
+    )
+
+    def test_import_creates_users_and_reports_rejections(self):
+        data = self.CSV.format(hospital_id=self.hospital.id).encode()
+        with self.assertNumQueries(8):
+            report = import_staff(data)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([line for line, _ in report.rejected], [4, 5, 6])
+
+        first, second = CustomUser.objects.filter(employee_number__in=['2001', '2002']).order_by('employee_number')
+        self.assertEqual((first.username, second.username), ('ivanov_ivan', 'ivanov_ivan_1'))
+        self.assertFalse(first.has_usable_password())
+        self.assertTrue(second.check_password('pass-2002-xyz'))
+        self.assertEqual(list(second.departments.all()), [self.department])
+
+    def test_save_resolves_username_in_one_query(self):
+        for i in range(3):
+            CustomUser.objects.create(employee_number=str(3000 + i), full_name='Сидоров Сидор')
+        user = CustomUser(employee_number='3010', full_name='Сидоров Сидор')
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual(user.username, 'sidorov_sidor_3')
+
+    def test_admin_upload(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        upload = SimpleUploadedFile('staff.csv', self.CSV.format(hospital_id=self.hospital.id).encode())
+        response = self.client.post(reverse('admin:accounts_customuser_import'), {'file': upload})
+        self.assertEqual(response.context['report'].created, 2)
+
+    def test_admin_upload_in_excel_encoding(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        url = reverse('admin:accounts_customuser_import')
+        upload = SimpleUploadedFile('staff.csv', self.CSV.format(hospital_id=self.hospital.id).encode('cp1251'))
+        response = self.client.post(url, {'file': upload})
+        self.assertEqual(response.context['report'].created, 2)
+        self.assertTrue(CustomUser.objects.filter(full_name='Иванов Иван Петрович').exists())
+
+        response = self.client.post(url, {'file': SimpleUploadedFile('staff.csv', b'\x98\x98')})
+        self.assertIsNone(response.context['report'])
+        self.assertIn('file', response.context['form'].errors)
+
+    def test_command_reads_excel_encoding(self):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory()), 'staff.csv')
+        path.write_bytes(self.CSV.format(hospital_id=self.hospital.id).encode('cp1251'))
+        out = StringIO()
+        call_command('import_staff', str(path), '--hash-workers', '1', stdout=out)
+        self.assertIn('Создано сотрудников: 2', out.getvalue())
+        self.assertTrue(CustomUser.objects.filter(full_name='Иванов Иван Петрович').exists())
+
+        path.write_bytes(b'\x98\x98')
+        with self.assertRaises(CommandError):
+            call_command('import_staff', str(path), stdout=StringIO())
+
+
+class PatientImportTests(HospitalTestMixin, TestCase):
+    HEADER = 'last_name,first_name,middle_name,birth_date,birth_place,snils,gender,height,weight,department,room_number,diagnosis,admission_date\n'
+
+    def test_checksum(self):
+        self.assertTrue(snils_checksum_valid('11223344595'))
+        self.assertFalse(snils_checksum_valid('11223344596'))
+        self.assertEqual(normalize_snils_batch(['112-233-445 95', None]), ['11223344595', ''])
+        self.assertEqual(normalize_snils_batch(['112\u2013233\u2013445\u00a095']), ['11223344595'])
+
+    def test_import_dedupes_and_maintains_derived_tables(self):
+        existing = self.create_patient(snils='08765430300')
+        csv_data = self.HEADER + (
+            'Смирнов,Олег,,1970-05-01,,112-233-445 95,М,175,70,T1,12,J18,2025-01-10 08:30\n'
+            'Дубль,Олег,,1970-05-01,,11223344595,M,175,70,,,,\n'
+            'Неверный,Олег,,1970-05-01,,11223344596,M,175,70,,,,\n'
+            'Уже,Есть,,01.02.1960,,087-654-303 00,Ж,160,60,,,,\n'
+            'Кузнецова,Анна,,01.02.1990,,001-001-997 11,F,165,55,,,,\n'
+        )
+        report = import_patients(StringIO(csv_data), self.hospital, batch_size=2)
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual([line for line, _ in report.rejected], [3, 4, 5])
+        smirnov = Patient.objects.get(snils='11223344595')
+        self.assertTrue(smirnov.is_hospitalized)
+        self.assertEqual(list(search_patients(self.hospital, last_name='смирнов')), [smirnov])
+        self.assertEqual(DepartmentCensus.objects.get(patient=smirnov).room_number, '12')
+        self.assertFalse(any(find_census_errors().values()))
+        self.assertEqual(Patient.objects.filter(snils=existing.snils).count(), 1)
+
+    def test_out_of_range_height_and_weight_are_rejected(self):
+        csv_data = self.HEADER + (
+            'Смирнов,Олег,,1970-05-01,,112-233-445 95,М,-175,70,,,,\n'
+            'Смирнов,Олег,,1970-05-01,,112-233-445 95,М,175,40000,,,,\n'
+            'Кузнецова,Анна,,01.02.1990,,001-001-997 11,F,165,55,,,,\n'
+        )
+        report = import_patients(StringIO(csv_data), self.hospital, max_rejected=1)
+
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.rejected_count, 2)
+        self.assertEqual(len(report.rejected), 1)
+        self.assertIn('Рост', report.rejected[0][1])
+        self.assertTrue(Patient.objects.filter(snils='00100199711').exists())
+
+
+class ExportTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='1', diagnosis='I10',
+            admission_date=timezone.make_aware(datetime(2025, 3, 1, 10, 0))
+        )
+        HealthNote.objects.create(admission=self.admission, note_type='info', hr_value=72,
+                                  created_at=timezone.make_aware(datetime(2025, 3, 2, 9, 0)))
+        HealthNote.objects.create(admission=self.admission, note_type='note', text='Осмотр, "жалоб нет"',
+                                  created_at=timezone.make_aware(datetime(2025, 3, 5, 9, 0)))
+        self.user.user_permissions.add(Permission.objects.get(codename='export_data'))
+
+    def test_requires_export_permission(self):
+        self.user.user_permissions.clear()
+        response = self.client.get(reverse('export', args=['notes']))
+        self.assertEqual(response.status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('export', args=['notes'])).status_code, 200)
+
+    def test_streaming_csv(self):
+        response = self.client.get(reverse('export', args=['notes']), {'date_to': '2025-03-03'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['id', 'admission_id', 'patient_id'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][6], '72')
+
+    def test_jsonl_with_note_type_filter(self):
+        response = self.client.get(reverse('export', args=['notes']), {'format': 'jsonl', 'note_type': 'note'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['text'], 'Осмотр, "жалоб нет"')
+        self.assertEqual(len(lines), 1)
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse('export', args=['admissions']), {'date_from': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('export', args=['admissions']), {'date_to': '2024-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_writes_to_stdout(self):
+        out = StringIO()
+        call_command('export_data', 'notes', '--hospital', str(self.hospital.id), '--format', 'jsonl', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+    def test_command_writes_file(self):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'admissions.csv'
+        call_command('export_data', 'admissions', '--hospital', str(self.hospital.id), '--department', 'T1',
+                     '--output', str(path), stderr=StringIO())
+        rows = list(csv.reader(path.open(encoding='utf-8')))
+        self.assertEqual(rows[1][7], 'T1')
+
+
+class CaseHistoryTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CASE_HISTORY_CACHE_DIR=self.cache_dir))
+        self.admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='7', diagnosis='I10'
+        )
+
+    def version(self):
+        return Admission.objects.values_list('content_version', flat=True).get(pk=self.admission.pk)
+
+    def test_second_request_is_served_from_disk(self):
+        url = reverse('admission_print', args=[self.admission.id])
+        first = self.client.get(url)
+        self.assertContains(first, 'История болезни')
+        with patch('accounts.case_history.render_case_history') as render:
+            second = self.client.get(url)
+        render.assert_not_called()
+        self.assertEqual(first.content, second.content)
+
+    def test_changes_bump_version_and_replace_file(self):
+        url = reverse('admission_print', args=[self.admission.id])
+        self.client.get(url)
+        version = self.version()
+        HealthNote.objects.create(admission=self.admission, note_type='note', text='Жалоб нет')
+        self.assertEqual(self.version(), version + 1)
+        self.assertContains(self.client.get(url), 'Жалоб нет')
+
+        self.admission.patient.last_name = 'Сидоров'
+        self.admission.patient.save()
+        self.assertContains(self.client.get(url), 'Сидоров')
+        files = list(Path(self.cache_dir, str(self.admission.id)).iterdir())
+        self.assertEqual([f.name for f in files], [f'v{self.version()}.html'])
+
+    def test_stale_save_keeps_concurrent_bump(self):
+        stale = Admission.objects.get(pk=self.admission.pk)
+        HealthNote.objects.create(admission=self.admission, note_type='note', text='Жалоб нет')
+        version = self.version()
+        stale.room_number = '8'
+        stale.save()
+        self.assertEqual(self.version(), version + 1)
+
+    def test_hospital_and_department_renames_bump_version(self):
+        url = reverse('admission_print', args=[self.admission.id])
+        self.client.get(url)
+        version = self.version()
+        self.department.name = 'Кардиология'
+        self.department.save()
+        self.hospital.name = 'Областная больница'
+        self.hospital.save()
+        self.assertEqual(self.version(), version + 2)
+        self.assertContains(self.client.get(url), 'Областная больница, Кардиология')
+
+    def test_other_hospital_is_not_found(self):
+        other = Hospital.objects.create(name='Другая', address='-')
+        self.user.hospital = other
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('admission_print', args=[self.admission.id])).status_code, 404)
+
+
+class SqliteProfileTests(SimpleTestCase):
+    def setUp(self):
+        self.path = str(Path(self.enterContext(tempfile.TemporaryDirectory())) / 'journal.sqlite3')
+
+    def file_connection(self, options=True):
+        # Отдельный псевдоним: соединения 'default' в SimpleTestCase запрещены
+        profile = {**settings.DATABASES['default'], 'NAME': self.path}
+        if not options:
+            profile.pop('OPTIONS')
+        handler = ConnectionHandler({'default': {'ENGINE': 'django.db.backends.dummy'}, 'profile': profile})
+        self.addCleanup(handler.close_all)
+        return handler
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        self.assertEqual(sqlite_pragma_mismatches(self.file_connection()['profile']), [])
+
+    def test_check_rejects_several_web_processes(self):
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([error.id for error in check_single_process_events()], ['accounts.E002'])
+        self.assertEqual(check_single_process_events(), [])
+
+    def test_check_reports_missing_pragmas(self):
+        with patch('accounts.checks.connections', self.file_connection(options=False)):
+            errors = check_sqlite_pragmas(databases=['profile'])
+        self.assertIn('journal_mode', {error.msg.split()[1] for error in errors})
+        self.assertEqual({error.id for error in errors}, {'accounts.E001'})
+
+    def test_check_runs_without_database_flag(self):
+        with patch('accounts.checks.connections', self.file_connection(options=False)):
+            with self.assertRaisesMessage(SystemCheckError, 'accounts.E001'):
+                call_command('check', stdout=StringIO(), stderr=StringIO())
+
+    def test_readers_and_writer_do_not_block_each_other(self):
+        self.file_connection()['profile'].ensure_connection()
+        # timeout=0: любое ожидание блокировки сразу даёт "database is locked"
+        writer = sqlite3.connect(self.path, isolation_level=None, timeout=0)
+        reader = sqlite3.connect(self.path, isolation_level=None, timeout=0)
+        self.addCleanup(writer.close)
+        self.addCleanup(reader.close)
+        writer.execute('CREATE TABLE note (id INTEGER PRIMARY KEY, text TEXT)')
+        writer.execute("INSERT INTO note (text) VALUES ('до')")
+
+        reader.execute('BEGIN')
+        self.assertEqual(reader.execute('SELECT count(*) FROM note').fetchone()[0], 1)
+        writer.execute('BEGIN IMMEDIATE')
+        writer.execute("INSERT INTO note (text) VALUES ('в процессе')")
+        self.assertEqual(reader.execute('SELECT count(*) FROM note').fetchone()[0], 1)
+        # В режиме журнала отката фиксация ждала бы завершения чтения
+        writer.execute('COMMIT')
+        self.assertEqual(reader.execute('SELECT count(*) FROM note').fetchone()[0], 1)
+        reader.execute('COMMIT')
+        self.assertEqual(reader.execute('SELECT count(*) FROM note').fetchone()[0], 2)
+
+
+class QueryPlanTests(HospitalTestMixin, TestCase):
+    # Прогоняет через EXPLAIN QUERY PLAN ровно те запросы, что выполняют страницы,
+    # и падает, если SQLite читает таблицу или индекс целиком
+    def setUp(self):
+        super().setUp()
+        self.patient = self.create_patient()
+        Admission.objects.create(patient=self.patient, department=self.department, room_number='1', diagnosis='J18',
+                                 admission_date=timezone.now() - timedelta(days=30),
+                                 discharge_date=timezone.now() - timedelta(days=20))
+        self.admission = Admission.objects.create(
+            patient=self.patient, department=self.department, room_number='2', diagnosis='I10'
+        )
+        HealthNote.objects.create(admission=self.admission, note_type='info', hr_value=70, valueHigh='120')
+        # Версия фрагмента отделения уже есть, как на работающем сервере; её
+        # первая запись считает строки таблицы кэша (отсечение DatabaseCache)
+        get_fragment_version('department', self.department.id)
+
+    def full_scans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                scans += [(row[3], query['sql']) for row in cursor.fetchall() if row[3].startswith('SCAN ')]
+        return scans
+
+    def test_hot_pages_use_indexes(self):
+        urls = [
+            reverse('patients') + '?last_name=Ив',
+            reverse('patients') + '?birth_date=1980-01-01',
+            reverse('department', args=[self.department.id]),
+            reverse('patient_detail', args=[self.patient.id]),
+            reverse('notes', args=[self.admission.id]),
+            reverse('notes_feed', args=[self.admission.id]) + '?note_type=info',
+            reverse('api-patient-list'),
+            reverse('api-admission-list') + f'?patient={self.patient.id}',
+            reverse('api-note-list') + f'?admission={self.admission.id}',
+            reverse('analytics', args=[self.admission.id]),
+            reverse('analytics_series', args=[self.admission.id]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.full_scans(url), [])
+
+    def test_active_admission_partial_index(self):
+        active = Admission.objects.filter(discharge_date__isnull=True)
+        ward = active.filter(department=self.department).order_by('room_number')
+        self.assertIn('admission_active_dept_idx', ward.explain())
+        self.assertIn('admission_active_patient_idx', active.filter(patient=self.patient).order_by().explain())
+        # Сверка переписи читает только частичный индекс, а не всю таблицу поступлений
+        self.assertIn('USING INDEX admission_active', active.order_by().explain())
+
+
+class SyntheticDataTests(TestCase):
+    def test_snils_checksum(self):
+        self.assertTrue(all(snils_checksum_valid(make_snils(2000000 + i)) for i in range(200)))
+
+    def test_generator_keeps_derived_tables_consistent(self):
+        counts = generate(hospitals=2, departments=3, staff=4, patients=30, months=1, seed=7, batch_size=20)
+        self.assertEqual(counts['patients'], Patient.objects.count())
+        self.assertEqual(counts['notes'], HealthNote.objects.count())
+        self.assertEqual(PatientSearchIndex.objects.count(), 60)
+        self.assertFalse(any(find_census_errors().values()))
+        self.assertEqual(
+            Patient.objects.filter(is_hospitalized=True).count(),
+            Admission.objects.filter(discharge_date__isnull=True).count()
+        )
+        self.assertFalse(HealthNote.objects.filter(note_type='info', systolic_value__isnull=True).exists())
+
+    def test_generator_is_seeded(self):
+        generate(patients=10, months=1, seed=3)
+        first = list(Patient.objects.order_by('id').values_list('last_name', 'birth_date'))
+        Patient.objects.all().delete()
+        generate(patients=10, months=1, seed=3)
+        self.assertEqual(list(Patient.objects.order_by('id').values_list('last_name', 'birth_date')), first)
+
+
+class RequestProfilingTests(HospitalTestMixin, TestCase):
+    def profiled_client(self, **overrides):
+        templates = [{**settings.TEMPLATES[0], 'BACKEND': 'accounts.profiling.ProfilingDjangoTemplates'}]
+        log_file = str(Path(self.enterContext(tempfile.TemporaryDirectory())) / 'logs' / 'slow.log')
+        self.enterContext(override_settings(
+            REQUEST_PROFILING=True, TEMPLATES=templates, REQUEST_PROFILING_LOG_FILE=log_file, **overrides
+        ))
+        client = Client()
+        client.force_login(self.user)
+        return client
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_server_timing_header(self):
+        client = self.profiled_client(REQUEST_PROFILING_SLOW_MS=60000, REQUEST_PROFILING_SLOW_QUERIES=1000)
+        with self.assertNoLogs('accounts.profiling'):
+            response = client.get(reverse('home'))
+        timing = response.headers['Server-Timing']
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('view;desc="home"', timing)
+
+    def test_slow_request_is_logged(self):
+        patient = self.create_patient()
+        admission = Admission.objects.create(patient=patient, department=self.department, room_number='1',
+                                             diagnosis='I10')
+        client = self.profiled_client(REQUEST_PROFILING_SLOW_QUERIES=1)
+        with self.assertLogs('accounts.profiling', level='WARNING') as logs:
+            client.get(reverse('notes', args=[admission.id]))
+            client.get(reverse('notes', args=[admission.id]))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'notes')
+        self.assertGreaterEqual(entry['queries'], 1)
+        self.assertEqual(len(entry['slowest']), min(entry['queries'], 3))
+
+    def test_duplicated_statements(self):
+        def execute(sql, params, many, context):
+            return None
+
+        profile = RequestProfile()
+        for params in ([1], [2], [3]):
+            profile.record_query(execute, 'SELECT * FROM t WHERE id = %s', params, False, {})
+        profile.record_query(execute, 'SELECT 1', [], False, {})
+        self.assertEqual(profile.duplicated(), [('SELECT * FROM t WHERE id = %s', 3)])
+        self.assertEqual(len(profile.slowest(limit=2)), 2)
+
+
+class FragmentCacheTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('department', args=[self.department.id])
+
+    def admit(self, patient, **kwargs):
+        return Admission.objects.create(
+            patient=patient, department=self.department, room_number='101', diagnosis='J18', **kwargs
+        )
+
+    def test_department_fragment_is_cached(self):
+        self.admit(self.create_patient())
+        self.client.get(self.url)
+        with self.assertNumQueries(5):
+            self.assertContains(self.client.get(self.url), 'Палата: 101')
+
+    def test_versions_are_shared_between_processes(self):
+        version = get_fragment_version('department', self.department.id)
+        # Другой процесс видит ту же таблицу версий, но не LocMem этого процесса
+        cache.clear()
+        self.assertEqual(get_fragment_version('department', self.department.id), version)
+        self.assertTrue(caches['fragment_versions'].has_key(fragment_version_key('department', self.department.id)))
+
+    def test_version_is_bumped_after_commit(self):
+        version = get_fragment_version('department', self.department.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admit(self.create_patient())
+            self.assertEqual(get_fragment_version('department', self.department.id), version)
+        self.assertGreater(get_fragment_version('department', self.department.id), version)
+
+    def test_admission_changes_invalidate_department(self):
+        patient = self.create_patient()
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            admission = self.admit(patient)
+        self.assertContains(self.client.get(self.url), 'Палата: 101')
+
+        patient.last_name = 'Сидоров'
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.save()
+        self.assertContains(self.client.get(self.url), 'Сидоров')
+
+        other = Department.objects.create(hospital=self.hospital, name='Хирургия', code='S1')
+        self.user.departments.add(other)
+        admission.department = other
+        with self.captureOnCommitCallbacks(execute=True):
+            admission.save()
+        self.assertNotContains(self.client.get(self.url), 'Сидоров')
+        self.assertContains(self.client.get(reverse('department', args=[other.id])), 'Сидоров')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('discharge_patient', args=[admission.id]))
+        self.assertNotContains(self.client.get(reverse('department', args=[other.id])), 'Сидоров')
+
+    def test_home_fragment_varies_by_allowed_departments(self):
+        other = Department.objects.create(hospital=self.hospital, name='Хирургия', code='S1')
+        self.assertContains(self.client.get(reverse('home')), 'Не назначено вам')
+        self.user.departments.add(other)
+        self.assertNotContains(self.client.get(reverse('home')), 'Не назначено вам')
+
+        other.name = 'Кардиология'
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        self.assertContains(self.client.get(reverse('home')), 'Кардиология')
+
+
+class StaticAssetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.hashed = staticfiles_storage.stored_name('css/styles.css')
+
+    def test_collectstatic_fingerprints_and_compresses(self):
+        self.assertNotEqual(self.hashed, 'css/styles.css')
+        original = Path(self.static_root, self.hashed).read_bytes()
+        self.assertEqual(gzip.decompress(Path(self.static_root, self.hashed + '.gz').read_bytes()), original)
+        self.assertEqual(brotli.decompress(Path(self.static_root, self.hashed + '.br').read_bytes()), original)
+        self.assertFalse(Path(self.static_root, staticfiles_storage.stored_name('Journal/images/logo.png') + '.gz').exists())
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        response = self.client.get(f'/static/{self.hashed}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(body, Path(self.static_root, self.hashed).read_bytes())
+
+        response = self.client.get(f'/static/{self.hashed}', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_refused_encodings_are_not_served(self):
+        url = f'/static/{self.hashed}'
+        for header in ('gzip;q=0', 'gzip; q=0.0, identity', '*;q=0', 'x-gzip'):
+            self.assertFalse(self.client.get(url, HTTP_ACCEPT_ENCODING=header).has_header('Content-Encoding'), header)
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='*')['Content-Encoding'], 'br')
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, *')['Content-Encoding'], 'gzip')
+
+    def test_unhashed_names_revalidate(self):
+        response = self.client.get('/static/css/styles.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+    def test_paths_outside_static_root(self):
+        self.assertEqual(self.client.get('/static/..%2Fmanage.py').status_code, 404)
+        self.assertEqual(self.client.get('/static/missing.css').status_code, 404)
+
+
+class VendorAssetTests(SimpleTestCase):
+    def test_templates_use_vendored_copy_when_present(self):
+        path, cdn_url = VENDOR_ASSETS['bootstrap.css']
+        is_vendored.cache_clear()
+        self.addCleanup(is_vendored.cache_clear)
+        static_dir = self.enterContext(tempfile.TemporaryDirectory())
+        with override_settings(STATICFILES_DIRS=[static_dir]):
+            self.assertEqual(vendor_asset_url('bootstrap.css'), cdn_url)
+            Path(static_dir, path).parent.mkdir(parents=True)
+            Path(static_dir, path).write_text('body{}')
+            is_vendored.cache_clear()
+            self.assertEqual(vendor_asset_url('bootstrap.css'), f'/static/{path}')
+
+    def test_check_warns_about_cdn_fallback(self):
+        is_vendored.cache_clear()
+        self.addCleanup(is_vendored.cache_clear)
+        with override_settings(STATICFILES_DIRS=[self.enterContext(tempfile.TemporaryDirectory())]):
+            self.assertEqual([warning.id for warning in check_vendor_assets()], ['accounts.W001'])
+        with patch('accounts.checks.is_vendored', return_value=True):
+            self.assertEqual(check_vendor_assets(), [])
+
+    def test_committed_files_match_lock(self):
+        lock = json.loads((Path(settings.STATICFILES_DIRS[0]) / VENDOR_LOCK_FILE).read_text(encoding='utf-8'))
+        out = StringIO()
+        with patch('accounts.management.commands.fetch_vendor_assets.VENDOR_FILES', dict.fromkeys(lock)):
+            call_command('fetch_vendor_assets', '--check', stdout=out)
+        self.assertIn(f'Проверено файлов: {len(lock)}', out.getvalue())
+
+
+class NotesFeedTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='3', diagnosis='I10'
+        )
+        start = timezone.now() - timedelta(days=10)
+        notes = [
+            HealthNote(admission=self.admission, note_type='info' if i % 2 else 'note',
+                       created_at=start + timedelta(hours=i // 3), text=f'Запись {i} ' + 'ж' * 300)
+            for i in range(75)
+        ]
+        HealthNote.objects.bulk_create(notes)
+        self.feed_url = reverse('notes_feed', args=[self.admission.id])
+
+    def collect(self, **params):
+        ids, cursor, queries = [], None, []
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            with CaptureQueriesContext(connection) as captured:
+                payload = self.client.get(self.feed_url, params).json()
+            queries.append(len(captured))
+            ids += [note['id'] for note in payload['results']]
+            cursor = payload['next_cursor']
+            if not cursor:
+                return ids, queries
+
+    def test_feed_walks_all_notes_in_order_without_duplicates(self):
+        self.client.get(self.feed_url)  # первый запрос кладёт отделения пользователя в сессию
+        ids, queries = self.collect()
+        expected = list(
+            self.admission.entry_notes.order_by('-created_at', '-pk').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        # Одинаковое число запросов на каждой странице, вне зависимости от глубины
+        self.assertEqual(len(set(queries)), 1, queries)
+        self.assertEqual(len(queries), 3)
+
+    def test_note_type_filter(self):
+        ids, _ = self.collect(note_type='info')
+        self.assertEqual(set(ids), set(
+            self.admission.entry_notes.filter(note_type='info').values_list('id', flat=True)
+        ))
+
+    def test_preview_is_truncated_in_database(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('notes', args=[self.admission.id]))
+        notes_sql = [q['sql'] for q in captured.captured_queries if 'accounts_healthnote' in q['sql']]
+        self.assertTrue(all('SUBSTR' in sql for sql in notes_sql))
+        self.assertNotContains(response, 'ж' * 120)
+        self.assertContains(response, 'data-cursor=')
+        preview = self.client.get(self.feed_url).json()['results'][0]['text']
+        self.assertEqual(len(preview), 100)
+        self.assertTrue(preview.endswith('…'))
+
+
+class ReadApiTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.patients = []
+        for i in range(12):
+            patient = self.create_patient(last_name=f'Пациент{i}')
+            Admission.objects.create(patient=patient, department=self.department, room_number=str(i),
+                                     diagnosis='I10', admission_date=timezone.now() - timedelta(days=i))
+            self.patients.append(patient)
+        self.url = reverse('api-patient-list')
+        self.client.get(self.url)  # первый запрос кладёт отделения пользователя в сессию
+
+    def test_list_is_scoped_to_hospital(self):
+        other = Hospital.objects.create(name='Другая', address='-')
+        stranger = self.create_patient(last_name='Чужой', hospital=other)
+        ids = [row['id'] for row in self.client.get(self.url, {'page_size': 50}).json()['results']]
+        self.assertEqual(sorted(ids), sorted(p.id for p in self.patients))
+        self.assertEqual(self.client.get(reverse('api-patient-detail', args=[stranger.id])).status_code, 404)
+
+    def test_cursor_pages_cover_all_rows_with_fixed_query_count(self):
+        ids, url, counts = [], self.url + '?page_size=5', []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                payload = self.client.get(url).json()
+            counts.append(len(queries))
+            ids += [row['id'] for row in payload['results']]
+            url = payload['next']
+        self.assertEqual(ids, [p.id for p in self.patients])
+        # Пользователь, страница пациентов и одна выборка их поступлений (сессия - из кэша)
+        self.assertEqual(counts, [4, 4, 4])
+
+    def test_sparse_fieldset(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,last_name'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'last_name'})
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('snils', queries.captured_queries[-1]['sql'])
+        self.assertEqual(self.client.get(self.url, {'fields': 'id,password'}).status_code, 400)
+
+    def test_etag_returns_not_modified_without_serializing(self):
+        etag = self.client.get(self.url)['ETag']
+        with patch.object(PatientViewSet, 'get_serializer') as get_serializer:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        get_serializer.assert_not_called()
+
+        # Изменение вложенного поступления тоже меняет ETag
+        admission = self.patients[0].admissions.get()
+        admission.room_number = '99'
+        admission.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_basic_auth_and_filters(self):
+        client = Client()
+        self.assertEqual(client.get(self.url).status_code, 401)
+        credentials = base64.b64encode(b'1001:secret-pass').decode()
+        admission = self.patients[0].admissions.get()
+        HealthNote.objects.create(admission=admission, note_type='info', hr_value=72)
+        response = client.get(reverse('api-note-list'), {'admission': admission.id},
+                              HTTP_AUTHORIZATION=f'Basic {credentials}')
+        self.assertEqual([row['hr_value'] for row in response.json()['results']], [72])
+        self.assertEqual(self.client.get(reverse('api-note-list')).status_code, 400)
+        response = self.client.get(reverse('api-admission-list'), {'patient': self.patients[1].id, 'active': 1})
+        self.assertEqual([row['room_number'] for row in response.json()['results']], ['1'])
+
+
+class VitalsIngestTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='4', diagnosis='I10'
+        )
+        self.url = reverse('api-vitals')
+        start = timezone.now() - timedelta(hours=10)
+        self.readings = [
+            {'reading_id': f'bed4-{i}', 'admission_id': self.admission.id,
+             'created_at': (start + timedelta(minutes=i)).isoformat(), 'hr_value': 60 + i % 30,
+             'systolic_value': 120, 'diastolic_value': 80, 'temperature_value': '36.6'}
+            for i in range(500)
+        ]
+
+    def post_jsonl(self, readings):
+        body = '\n'.join(json.dumps(reading) for reading in readings)
+        return self.client.post(self.url, body, content_type='application/x-ndjson')
+
+    def test_batch_is_written_in_bulk_and_idempotent(self):
+        version = self.admission.content_version
+        with CaptureQueriesContext(connection) as queries:
+            result = self.post_jsonl(self.readings).json()
+        self.assertEqual((result['created'], result['duplicates'], result['errors']), (500, 0, []))
+        self.assertLess(len(queries), 25)
+        note = HealthNote.objects.get(client_reading_id='bed4-0')
+        self.assertEqual((note.note_type, note.valueHigh, note.systolic_value), ('info', '120', 120))
+        self.assertEqual(note.temperature_value, Decimal('36.6'))
+        self.admission.refresh_from_db()
+        self.assertEqual(self.admission.content_version, version + 1)
+
+        # Монитор переотправил пакет целиком после обрыва связи
+        result = self.client.post(self.url, json.dumps(self.readings[:10]), content_type='application/json').json()
+        self.assertEqual((result['created'], result['duplicates']), (0, 10))
+        self.assertEqual(HealthNote.objects.count(), 500)
+
+    def test_reading_ids_are_scoped_to_admission(self):
+        other = Hospital.objects.create(name='Другая', address='-')
+        foreign = Admission.objects.create(
+            patient=self.create_patient(hospital=other), department=self.department, room_number='1', diagnosis='-'
+        )
+        HealthNote.objects.create(admission=foreign, note_type='info', hr_value=70, client_reading_id='bed4-0')
+        result = self.post_jsonl(self.readings[:3]).json()
+        self.assertEqual((result['created'], result['duplicates']), (3, 0))
+        self.assertTrue(HealthNote.objects.filter(admission=self.admission, client_reading_id='bed4-0').exists())
+
+    def test_counts_only_rows_actually_inserted(self):
+        version = self.admission.content_version
+        build_note = ingest._build_note
+
+        def racing_build_note(reading):
+            # Параллельный пакет успел записать то же показание после проверки existing
+            if not HealthNote.objects.filter(client_reading_id=reading['reading_id']).exists():
+                HealthNote.objects.create(
+                    admission=self.admission, note_type='info', hr_value=70, client_reading_id=reading['reading_id']
+                )
+            return build_note(reading)
+
+        with patch.object(ingest, '_build_note', racing_build_note):
+            result = self.post_jsonl(self.readings[:1]).json()
+        self.assertEqual((result['created'], result['duplicates']), (0, 1))
+        self.assertEqual(HealthNote.objects.filter(client_reading_id='bed4-0').count(), 1)
+        self.admission.refresh_from_db()
+        # Версию поднял только сигнал параллельной записи
+        self.assertEqual(self.admission.content_version, version + 1)
+
+    def test_invalid_readings_are_reported_by_index(self):
+        other = Hospital.objects.create(name='Другая', address='-')
+        foreign = Admission.objects.create(
+            patient=self.create_patient(hospital=other), department=self.department, room_number='1', diagnosis='-'
+        )
+        readings = [
+            self.readings[0],
+            dict(self.readings[1], hr_value=900),
+            dict(self.readings[2], created_at=(timezone.now() + timedelta(hours=1)).isoformat()),
+            dict(self.readings[3], admission_id=foreign.id),
+            dict(self.readings[5], created_at='2024-02-30T10:00:00'),
+            {'reading_id': 'empty', 'admission_id': self.admission.id, 'created_at': self.readings[4]['created_at']},
+            'garbage',
+        ]
+        result = self.client.post(self.url, json.dumps(readings), content_type='application/json').json()
+        self.assertEqual(result['created'], 1)
+        self.assertEqual({row['index']: set(row['errors']) for row in result['errors']}, {
+            1: {'hr_value'}, 2: {'created_at'}, 3: {'admission_id'}, 4: {'created_at'}, 5: {'reading'}, 6: {'reading'},
+        })
+        self.assertFalse(HealthNote.objects.filter(admission=foreign).exists())
+
+    def test_malformed_body(self):
+        response = self.client.post(self.url, '{"reading_id": "a"}\n{oops', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, json.dumps({'reading_id': 'a'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DepartmentEventsTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = DepartmentBroker()
+        self.enterContext(patch.object(events, 'broker', self.broker))
+        self.url = reverse('department_events', args=[self.department.id])
+
+    def published(self, department):
+        return [(event['type'], event['data']) for event in self.broker._history[department.id]]
+
+    def test_committed_changes_are_published(self):
+        ward = Department.objects.create(hospital=self.hospital, name='Хирургия', code='S1')
+        with self.captureOnCommitCallbacks(execute=True):
+            admission = Admission.objects.create(
+                patient=self.create_patient(), department=self.department, room_number='5', diagnosis='I10'
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            admission.room_number = '6'
+            admission.save()
+            HealthNote.objects.create(admission=admission, note_type='info', hr_value=88)
+            HealthNote.objects.create(admission=admission, note_type='note', text='Без показателей')
+        with self.captureOnCommitCallbacks(execute=True):
+            admission.department = ward
+            admission.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            admission.discharge_date = timezone.now()
+            admission.save()
+
+        types = [event_type for event_type, _ in self.published(self.department)]
+        self.assertEqual(types, ['admission', 'room', 'vitals', 'discharge'])
+        self.assertEqual(self.published(self.department)[1][1], {'admission_id': admission.id, 'room_number': '6'})
+        self.assertEqual([event_type for event_type, _ in self.published(ward)], ['admission', 'discharge'])
+
+    def test_batch_ingest_publishes_latest_reading(self):
+        admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='5', diagnosis='I10'
+        )
+        start = timezone.now() - timedelta(hours=1)
+        readings = [
+            {'reading_id': f'r{i}', 'admission_id': admission.id,
+             'created_at': (start + timedelta(minutes=i)).isoformat(), 'hr_value': 60 + i}
+            for i in range(20)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('api-vitals'), json.dumps(readings), content_type='application/json')
+        self.assertEqual(
+            [(event_type, data['hr_value']) for event_type, data in self.published(self.department)],
+            [('vitals', 79)]
+        )
+
+    def test_rolled_back_changes_are_not_published(self):
+        admission = Admission.objects.create(
+            patient=self.create_patient(), department=self.department, room_number='5', diagnosis='I10'
+        )
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    admission.room_number = '9'
+                    admission.save()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.published(self.department), [])
+
+    async def test_stream_pushes_events_from_other_threads(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        self.assertEqual(self.broker.subscriber_count(self.department.id), 1)
+
+        # Публикация идёт из потока воркера, как после коммита в синхронном представлении
+        await asyncio.to_thread(self.broker.publish, self.department.id, 'vitals', {'admission_id': 1, 'hr_value': 70})
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b'event: vitals', chunk)
+        self.assertIn(b'"hr_value": 70', chunk)
+
+        # Отключение клиента: сервер отменяет задачу, ожидающую следующего события
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(self.broker.subscriber_count(self.department.id), 0)
+
+    async def test_replay_after_reconnect(self):
+        first = self.broker.publish(self.department.id, 'room', {'admission_id': 1, 'room_number': '2'})
+        self.broker.publish(self.department.id, 'discharge', {'admission_id': 1})
+        subscription, missed = self.broker.subscribe(self.department.id, first['id'])
+        self.assertEqual([event['type'] for event in missed], ['discharge'])
+        self.broker.unsubscribe(subscription)
+
+        for _ in range(events.REPLAY_BUFFER_SIZE):
+            self.broker.publish(self.department.id, 'vitals', {})
+        subscription, missed = self.broker.subscribe(self.department.id, first['id'])
+        self.assertIsNone(missed)
+        self.broker.unsubscribe(subscription)
+
+    def test_foreign_event_id_gets_snapshot_from_database(self):
+        admission = Admission.objects.create(
+            patient=self.create_patient(last_name='Сидоров'), department=self.department,
+            room_number='5', diagnosis='I10'
+        )
+        self.broker.publish(self.department.id, 'vitals', {})
+        # id выдан другим процессом сервера: буфер этого процесса к нему не относится
+        response = self.client.get(self.url, {'last_event_id': 'feedbeef-1'})
+        self.assertNotContains(response, 'event: reload')
+        event = response.content.decode().split('\n\n')[1]
+        self.assertIn(f'id: {self.broker.last_event_id(self.department.id)}\nevent: snapshot', event)
+        rows = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual([(row['admission_id'], row['room_number']) for row in rows], [(admission.id, '5')])
+        self.assertIn('Сидоров', rows[0]['name'])
+
+    def test_wsgi_returns_missed_events_and_closes(self):
+        seen = self.broker.publish(self.department.id, 'room', {'admission_id': 3, 'room_number': '2'})
+        self.broker.publish(self.department.id, 'discharge', {'admission_id': 3})
+        response = self.client.get(self.url, {'last_event_id': seen['id']})
+        self.assertContains(response, 'event: discharge')
+        self.assertNotContains(response, 'event: room')
+        self.assertEqual(self.broker.subscriber_count(self.department.id), 0)
+
+        other = Department.objects.create(hospital=self.hospital, name='Хирургия', code='S1')
+        self.assertEqual(self.client.get(reverse('department_events', args=[other.id])).status_code, 404)
+
+
+@override_settings(
+    SESSION_ENGINE='accounts.sessions',
+    SESSION_CACHE_ALIAS='sessions',
+    CACHES={**settings.CACHES, 'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-sessions'
+    }},
+)
+class CachedSessionTests(HospitalTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session_key = self.client.session.session_key
+        self.url = reverse('home')
+
+    def session_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return [q['sql'].split()[0] for q in queries.captured_queries if 'django_session' in q['sql']]
+
+    def stored_in_db(self):
+        return Session.objects.get(session_key=self.session_key).get_decoded()
+
+    @override_settings(SESSION_ACTIVITY_RESOLUTION=0)
+    def test_activity_is_kept_in_cache_between_db_writes(self):
+        self.assertEqual(self.session_queries(), [])
+        self.assertIn(ACTIVITY_KEY, SessionStore(self.session_key).load())
+        self.assertNotIn(ACTIVITY_KEY, self.stored_in_db())
+
+        with override_settings(SESSION_DB_WRITE_INTERVAL=0):
+            self.assertIn('UPDATE', self.session_queries())
+        self.assertIn(ACTIVITY_KEY, self.stored_in_db())
+
+    def test_real_changes_are_written_immediately(self):
+        session = SessionStore(self.session_key)
+        session['report_filter'] = 'T1'
+        session.save()
+        self.assertEqual(self.stored_in_db()['report_filter'], 'T1')
+
+    def test_cache_miss_falls_back_to_database(self):
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+        self.assertEqual(self.session_queries(), ['SELECT'])
+        self.assertEqual(self.session_queries(), [])
+
+    def test_cleanup_deletes_expired_sessions_in_batches(self):
+        for _ in range(7):
+            SessionStore().create()
+        Session.objects.exclude(session_key=self.session_key).update(expire_date=timezone.now() - timedelta(days=1))
+        out = StringIO()
+        call_command('cleanup_sessions', batch_size=3, pause=0, stdout=out)
+        self.assertIn('Удалено истёкших сессий: 7', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [self.session_key])
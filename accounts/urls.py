@@ -1,7 +1,14 @@
-from django.urls import path
-from . import views
+from django.urls import include, path
+from rest_framework.routers import SimpleRouter
+
+from . import api, views
 from django.views.generic.base import RedirectView
 
+router = SimpleRouter()
+router.register('patients', api.PatientViewSet, basename='api-patient')
+router.register('admissions', api.AdmissionViewSet, basename='api-admission')
+router.register('notes', api.HealthNoteViewSet, basename='api-note')
+
 urlpatterns = [
     path('', RedirectView.as_view(url='/login/', permanent=False)),  # Добавьте эту строку
     path('register/', views.register_view, name='register'),
@@ -9,17 +16,25 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('home/', views.home_view, name='home'),
     path('department/<int:department_id>/', views.department_view, name='department'),
+    path('department/<int:department_id>/events/', views.department_events_view, name='department_events'),
     path('patients/', views.patients_view, name='patients'),
+    path('patients/search/', views.patient_search_view, name='patient_search'),
     path('patients/add/', views.add_patient_view, name='add_patient'),
     path('patients/<int:patient_id>/', views.patient_detail_view, name='patient_detail'),
     path('admissions/<int:admission_id>/', views.admission_detail_view, name='admission_detail'),
+    path('admissions/<int:admission_id>/print/', views.admission_print_view, name='admission_print'),
     path('admissions/<int:admission_id>/discharge/', views.discharge_patient_view, name='discharge_patient'),
     path('admissions/add/<int:patient_id>/', views.add_admission_view, name='add_admission'),
     path('mkb10-search/', views.mkb10_search_view, name='mkb10_search'),
     path('patients/<int:patient_id>/edit/', views.edit_patient_view, name='edit_patient'),
     path('admissions/<int:admission_id>/notes/', views.notes_view, name='notes'),
+    path('admissions/<int:admission_id>/notes/feed/', views.notes_feed_view, name='notes_feed'),
     path('admissions/<int:admission_id>/notes/add/', views.add_note_view, name='add_note'),
     path('notes/<int:note_id>/', views.note_detail_view, name='note_detail'),
+    path('export/<str:dataset>/', views.export_view, name='export'),
     path('admissions/<int:admission_id>/analytics/', views.analytics_view, name='analytics'),
+    path('admissions/<int:admission_id>/analytics/series/', views.analytics_series_view, name='analytics_series'),
+    path('api/vitals/', api.VitalsIngestView.as_view(), name='api-vitals'),
+    path('api/', include(router.urls)),
 
 ]
@@ -1,22 +1,45 @@
+import mimetypes
 import re
+from pathlib import Path
 
-import requests
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
+from django.urls import reverse
+from django.db import transaction
 from django.utils import timezone
-from django.db.models import Max
+from django.utils._os import safe_join
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
 from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models.functions import Substr
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import render
 from django.views.decorators.csrf import requires_csrf_token
 from django.template import RequestContext
+from django.views.static import was_modified_since
 
+from . import case_history, events, exports, gigdata, mkb10
+from .caching import get_fragment_version
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, PatientCreateForm, AdmissionCreateForm
-from .models import Patient, Department, Admission, HealthNote
+from .models import Patient, Department, Admission, HealthNote, DepartmentCensus
+from .pagination import paginate_keyset
+from .search import search_patient_ids, typeahead
+from .storage import is_hashed_name
+from .vitals import build_series
+
+PATIENTS_PAGE_SIZE = 50
+NOTES_PAGE_SIZE = 30
+NOTE_PREVIEW_LENGTH = 100
+NOTE_LIST_FIELDS = (
+    'id', 'admission_id', 'note_type', 'created_at', 'valueHigh', 'valueLow', 'hr_value', 'temperature_value'
+)
+SERIES_MAX_POINTS = 5000
 
 
 @requires_csrf_token
@@ -35,31 +58,19 @@ def hospital_required(view_func):
 
 @login_required
 def mkb10_search_view(request):
-    if not settings.GIGDATA_API_KEY:
-        raise ValueError("API key not configured")
     if request.method == 'POST':
         query = request.POST.get('query', '')
 
-        headers = {
-            'Authorization': settings.GIGDATA_API_KEY,
-            'Accept': 'application/json'
-        }
+        # Локальный справочник отвечает без обращения к внешнему сервису
+        if len(mkb10.get_index()):
+            return JsonResponse(mkb10.suggest(query))
 
-        payload = {
-            "query": query,
-            "count": 100
-        }
+        if not settings.GIGDATA_API_KEY:
+            raise ValueError("API key not configured")
 
         try:
-            response = requests.post(
-                'https://api.gigdata.ru/api/v2/suggest/mkb',
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            return JsonResponse(data)
-        except requests.exceptions.RequestException as e:
+            return JsonResponse(gigdata.get_client().suggest(query))
+        except gigdata.GigdataError as e:
             return JsonResponse({'error': str(e)}, status=500)
 
     return render(request, 'accounts/mkb10_search.html')
@@ -97,10 +108,14 @@ def logout_view(request):
 @login_required
 @hospital_required
 def home_view(request):
+    # Список отделений рендерится из кэша, queryset выполняется только при промахе
     departments = Department.objects.filter(hospital=request.user.hospital)
     context = {
         'departments': departments,
-        'hospital': request.user.hospital
+        'hospital': request.user.hospital,
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'fragment_version': get_fragment_version('hospital', request.user.hospital_id),
+        'allowed_departments': ','.join(map(str, sorted(request.user.department_ids)))
     }
     return render(request, 'accounts/home.html', context)
 
@@ -113,35 +128,62 @@ def department_view(request, department_id):
         id=department_id,
         hospital=request.user.hospital
     )
-    if not request.user.departments.filter(id=department_id).exists():
+    if department.id not in request.user.department_ids:
         return redirect('home')
-    patients = department.get_current_patients()
+    census = DepartmentCensus.objects.filter(department=department).select_related('patient')
     return render(request, 'accounts/department.html', {
         'department': department,
-        'patients': patients
+        'census': census,
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'fragment_version': get_fragment_version('department', department.id),
+        'last_event_id': events.broker.last_event_id(department.id)
     })
 
 
+@login_required
+async def department_events_view(request, department_id):
+    user = await request.auser()
+    if not user.hospital_id:
+        raise Http404
+    department_ids = await sync_to_async(lambda: user.department_ids)()
+    if department_id not in department_ids:
+        raise Http404
+    if not await Department.objects.filter(id=department_id, hospital_id=user.hospital_id).aexists():
+        raise Http404
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or None
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            events.department_stream(department_id, last_event_id), content_type='text/event-stream'
+        )
+    else:
+        # Под WSGI открытый поток занял бы поток сервера: отдаём пропущенные
+        # события и закрываем, браузер переподключится через retry
+        chunks = [chunk async for chunk in events.department_stream(department_id, last_event_id, follow=False)]
+        response = HttpResponse(''.join(chunks), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 @hospital_required
 def patients_view(request):
-    patients = Patient.objects.filter(hospital=request.user.hospital).annotate(
-        last_admission_date=Max('admissions__admission_date')
-    ).order_by('-last_admission_date')
+    patients = Patient.objects.filter(hospital=request.user.hospital)
 
     search_performed = False
+    next_url = None
 
     if request.method == 'GET' and any(
-            param in request.GET for param in ['last_name', 'first_name', 'middle_name', 'snils', 'birth_date']):
+            param in request.GET for param in ['last_name', 'first_name', 'middle_name', 'snils', 'birth_date', 'cursor']):
         search_performed = True
         search_query = {}
 
-        if last_name := request.GET.get('last_name'):
-            search_query['last_name__icontains'] = last_name
-        if first_name := request.GET.get('first_name'):
-            search_query['first_name__icontains'] = first_name
-        if middle_name := request.GET.get('middle_name'):
-            search_query['middle_name__icontains'] = middle_name
+        names = {
+            field: request.GET.get(field, '')
+            for field in ('last_name', 'first_name', 'middle_name')
+        }
+        if any(names.values()):
+            search_query['id__in'] = search_patient_ids(request.user.hospital, **names)
         if snils := request.GET.get('snils'):
             search_query['snils__icontains'] = snils.replace('-', '').replace(' ', '')
         if birth_date := request.GET.get('birth_date'):
@@ -150,10 +192,41 @@ def patients_view(request):
         if search_query:
             patients = patients.filter(**search_query)
 
+        patients = paginate_keyset(
+            patients, 'last_admission_date', request.GET.get('cursor'), PATIENTS_PAGE_SIZE
+        )
+        if patients.has_next:
+            params = request.GET.copy()
+            params['cursor'] = patients.next_cursor
+            next_url = f'?{params.urlencode()}'
+
     return render(request, 'accounts/patients.html', {
         'patients': patients,
         'search_params': request.GET,
-        'search_performed': search_performed
+        'search_performed': search_performed,
+        'next_url': next_url
+    })
+
+
+@login_required
+@hospital_required
+def patient_search_view(request):
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+    patients = typeahead(request.user.hospital, request.GET.get('q', ''), limit=limit)
+    return JsonResponse({
+        'results': [
+            {
+                'id': patient.id,
+                'full_name': str(patient).strip(),
+                'birth_date': patient.birth_date.isoformat(),
+                'snils': patient.formatted_snils(),
+                'url': reverse('patient_detail', args=[patient.id]),
+            }
+            for patient in patients
+        ]
     })
 
 
@@ -184,7 +257,8 @@ def add_admission_view(request, patient_id):
         if admission_form.is_valid():
             admission = admission_form.save(commit=False)
             admission.patient = patient
-            admission.save()
+            with transaction.atomic():
+                admission.save()
             return redirect('patient_detail', patient_id=patient.id)
     else:
         admission_form = AdmissionCreateForm(hospital=request.user.hospital)
@@ -250,6 +324,21 @@ def admission_detail_view(request, admission_id):
     })
 
 
+@login_required
+@hospital_required
+def admission_print_view(request, admission_id):
+    # Дешёвая проверка доступа и версии; сам документ берётся с диска,
+    # а рендерится только если поступление менялось с прошлой печати
+    version = Admission.objects.filter(
+        id=admission_id,
+        patient__hospital=request.user.hospital
+    ).values_list('content_version', flat=True).first()
+    if version is None:
+        raise Http404
+    content = case_history.get_case_history(admission_id, version)
+    return HttpResponse(content, content_type='text/html; charset=utf-8')
+
+
 @login_required
 @hospital_required
 def discharge_patient_view(request, admission_id):
@@ -262,7 +351,8 @@ def discharge_patient_view(request, admission_id):
 
     if request.method == 'POST':
         admission.discharge_date = timezone.now()
-        admission.save()
+        with transaction.atomic():
+            admission.save()
         return redirect('patient_detail', patient_id=admission.patient.id)
 
     return redirect('admission_detail', admission_id=admission_id)
@@ -305,17 +395,6 @@ def edit_patient_view(request, patient_id):
     })
 
 
-@login_required
-@hospital_required
-def notes_view(request, admission_id):
-    admission = get_object_or_404(Admission, id=admission_id, patient__hospital=request.user.hospital)
-    notes = admission.entry_notes.all().order_by('-created_at')
-    return render(request, 'accounts/notes.html', {
-        'admission': admission,
-        'notes': notes
-    })
-
-
 @login_required
 @hospital_required
 def add_note_view(request, admission_id):
@@ -356,18 +435,99 @@ def add_note_view(request, admission_id):
     })
 
 
+def notes_page(admission, note_type, cursor, page_size=NOTES_PAGE_SIZE):
+    # Только колонки списка; полный текст загружает note_detail_view
+    notes = admission.entry_notes.only(*NOTE_LIST_FIELDS).annotate(
+        text_preview=Substr('text', 1, NOTE_PREVIEW_LENGTH + 1)
+    )
+    if note_type:
+        notes = notes.filter(note_type=note_type)
+    page = paginate_keyset(notes, 'created_at', cursor, page_size)
+    for note in page:
+        preview = note.text_preview or ''
+        if len(preview) > NOTE_PREVIEW_LENGTH:
+            preview = preview[:NOTE_PREVIEW_LENGTH - 1] + '…'
+        note.text_preview = preview
+    return page
+
+
+def _note_type_param(request):
+    note_type = request.GET.get('note_type', '')
+    return note_type if note_type in dict(HealthNote.NOTE_TYPE_CHOICES) else ''
+
+
 @login_required
 @hospital_required
 def notes_view(request, admission_id):
     admission = get_object_or_404(Admission, id=admission_id, patient__hospital=request.user.hospital)
-    notes = admission.entry_notes.order_by('-created_at')  # Получаем записи, связанные с поступлением
+    note_type = _note_type_param(request)
+    notes = notes_page(admission, note_type, request.GET.get('cursor'))
 
     return render(request, 'accounts/notes.html', {
         'admission': admission,
-        'notes': notes
+        'notes': notes,
+        'note_type': note_type,
+        'note_types': HealthNote.NOTE_TYPE_CHOICES
     })
 
 
+@login_required
+@hospital_required
+def notes_feed_view(request, admission_id):
+    admission = get_object_or_404(Admission, id=admission_id, patient__hospital=request.user.hospital)
+    page = notes_page(admission, _note_type_param(request), request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [
+            {
+                'id': note.id,
+                'url': reverse('note_detail', args=[note.id]),
+                'note_type': note.note_type,
+                'note_type_display': note.get_note_type_display(),
+                'created_at': timezone.localtime(note.created_at).strftime('%d.%m.%Y %H:%M'),
+                'text': note.text_preview,
+                'valueHigh': note.valueHigh,
+                'valueLow': note.valueLow,
+                'hr_value': note.hr_value,
+                'temperature_value': note.temperature_value,
+            }
+            for note in page
+        ],
+        'next_cursor': page.next_cursor
+    })
+
+
+def can_export(user):
+    return user.is_staff or user.has_perm('accounts.export_data')
+
+
+@login_required
+@hospital_required
+def export_view(request, dataset):
+    # Выгрузка отдаёт данные всей больницы, поэтому она не для каждого сотрудника
+    if not can_export(request.user):
+        return JsonResponse({'error': 'Нет доступа к выгрузке данных'}, status=403)
+    export_format = request.GET.get('format', 'csv')
+    if dataset not in exports.DATASETS or export_format not in exports.EXPORT_FORMATS:
+        return JsonResponse({'error': 'Неизвестный набор данных или формат'}, status=400)
+    try:
+        filters = exports.parse_filters(
+            date_from=request.GET.get('date_from'),
+            date_to=request.GET.get('date_to'),
+            department=request.GET.get('department'),
+            note_type=request.GET.get('note_type')
+        )
+    except exports.ExportFilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = StreamingHttpResponse(
+        exports.export(dataset, request.user.hospital, export_format, filters),
+        content_type=exports.EXPORT_FORMATS[export_format]
+    )
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 @hospital_required
 def note_detail_view(request, note_id):
@@ -377,48 +537,104 @@ def note_detail_view(request, note_id):
     })
 
 
-from django.shortcuts import render, get_object_or_404
-
-
+@login_required
+@hospital_required
 def analytics_view(request, admission_id):
-    admission = get_object_or_404(Admission, id=admission_id)
+    admission = get_object_or_404(Admission, id=admission_id, patient__hospital=request.user.hospital)
     metric = request.GET.get('metric', 'hr')  # по умолчанию ЧСС
+    if metric not in ('hr', 'temp', 'bp'):
+        metric = 'hr'
+    return render(request, 'accounts/analytics.html', {
+        'metric': metric,
+        'admission': admission
+    })
 
-    if metric == 'temp':
-        data_points = HealthNote.objects.filter(admission=admission).exclude(temperature_value__isnull=True).order_by(
-            'created_at')
-        labels = [note.created_at.strftime("%d.%m %H:%M") for note in data_points]
-        values = [float(note.temperature_value) for note in data_points]
-        context = {
-            'labels': labels,
-            'values': values,
-            'metric': metric,
-            'admission': admission
-        }
-    elif metric == 'bp':
-        data_points = HealthNote.objects.filter(admission=admission).filter(valueHigh__isnull=False,
-                                                                            valueLow__isnull=False).order_by(
-            'created_at')
-        labels = [note.created_at.strftime("%d.%m %H:%M") for note in data_points]
-        value_high = [int(note.valueHigh) for note in data_points]
-        value_low = [int(note.valueLow) for note in data_points]
-        context = {
-            'labels': labels,
-            'value_high': value_high,
-            'value_low': value_low,
-            'metric': metric,
-            'admission': admission
-        }
-    else:
-        data_points = HealthNote.objects.filter(admission=admission).exclude(hr_value__isnull=True).order_by(
-            'created_at')
-        labels = [note.created_at.strftime("%d.%m %H:%M") for note in data_points]
-        values = [note.hr_value for note in data_points]
-        context = {
-            'labels': labels,
-            'values': values,
-            'metric': metric,
-            'admission': admission
-        }
 
-    return render(request, 'accounts/analytics.html', context)
+@login_required
+@hospital_required
+def analytics_series_view(request, admission_id):
+    admission = get_object_or_404(Admission, id=admission_id, patient__hospital=request.user.hospital)
+    try:
+        bucket = int(request.GET.get('bucket') or 0)
+        points = int(request.GET.get('points') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'bucket и points должны быть целыми числами'}, status=400)
+    if bucket < 0:
+        return JsonResponse({'error': 'bucket должен быть положительным числом секунд'}, status=400)
+    try:
+        start = parse_datetime(request.GET.get('from') or '')
+        end = parse_datetime(request.GET.get('to') or '')
+    except ValueError:
+        # Верный формат, но несуществующее время (например, 30 февраля)
+        return JsonResponse({'error': 'Неверное время в from или to'}, status=400)
+
+    series = build_series(
+        admission,
+        bucket_seconds=bucket or None,
+        max_points=min(max(points, 0), SERIES_MAX_POINTS) or SERIES_MAX_POINTS,
+        start=start,
+        end=end
+    )
+    return JsonResponse({
+        'admission': admission.id,
+        'bucket': bucket or None,
+        'series': series
+    })
+
+
+# Предпочтительный порядок заранее сжатых копий, созданных collectstatic
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(header):
+    # Accept-Encoding -> {кодировка: q}; «gzip;q=0» означает запрет, а не согласие
+    qualities = {}
+    for token in header.split(','):
+        name, _, params = token.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+@require_http_methods(['GET', 'HEAD'])
+def static_asset_view(request, path):
+    try:
+        full_path = Path(safe_join(settings.STATIC_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404
+    if not full_path.is_file():
+        raise Http404
+
+    served, content_encoding = full_path, None
+    qualities = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    for encoding, suffix in STATIC_ENCODINGS:
+        candidate = full_path.with_name(full_path.name + suffix)
+        if qualities.get(encoding, qualities.get('*', 0)) > 0 and candidate.is_file():
+            served, content_encoding = candidate, encoding
+            break
+
+    mtime = served.stat().st_mtime
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), mtime):
+        return HttpResponseNotModified()
+
+    content_type = mimetypes.guess_type(full_path.name)[0] or 'application/octet-stream'
+    response = FileResponse(served.open('rb'), content_type=content_type, filename=full_path.name)
+    response['Last-Modified'] = http_date(mtime)
+    response['Vary'] = 'Accept-Encoding'
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    if is_hashed_name(path):
+        response['Cache-Control'] = f'public, max-age={settings.STATIC_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
@@ -0,0 +1,91 @@
+from .models import HealthNote
+
+# Имя ряда в ответе API -> поле HealthNote
+SERIES_FIELDS = {
+    'hr': 'hr_value',
+    'temp': 'temperature_value',
+    'bp_high': 'systolic_value',
+    'bp_low': 'diastolic_value',
+}
+
+
+def load_series(admission, start=None, end=None):
+    notes = HealthNote.objects.filter(admission=admission)
+    if start:
+        notes = notes.filter(created_at__gte=start)
+    if end:
+        notes = notes.filter(created_at__lt=end)
+
+    series = {name: [] for name in SERIES_FIELDS}
+    rows = notes.order_by('created_at').values_list('created_at', *SERIES_FIELDS.values())
+    for created_at, *values in rows.iterator(chunk_size=5000):
+        timestamp = int(created_at.timestamp() * 1000)
+        for name, value in zip(SERIES_FIELDS, values):
+            if value is not None:
+                series[name].append((timestamp, float(value)))
+    return series
+
+
+def bucketize(points, bucket_seconds):
+    # Точки должны быть отсортированы по времени; на корзину [t, min, max, mean]
+    size = bucket_seconds * 1000
+    buckets = []
+    current = None
+    for timestamp, value in points:
+        start = timestamp - timestamp % size
+        if current is None or current[0] != start:
+            current = [start, value, value, 0.0, 0]
+            buckets.append(current)
+        current[1] = min(current[1], value)
+        current[2] = max(current[2], value)
+        current[3] += value
+        current[4] += 1
+    return [[start, low, high, round(total / count, 2)] for start, low, high, total, count in buckets]
+
+
+def downsample(points, threshold, value_index=1):
+    # Largest-Triangle-Three-Buckets: сохраняет форму кривой (пики и провалы)
+    # при сокращении ряда до threshold точек
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, len(points))
+        avg_range = points[avg_start:avg_end]
+        avg_x = sum(p[0] for p in avg_range) / len(avg_range)
+        avg_y = sum(p[value_index] for p in avg_range) / len(avg_range)
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = points[a][0], points[a][value_index]
+        max_area = -1
+        chosen = range_start
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (points[j][value_index] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                chosen = j
+        sampled.append(points[chosen])
+        a = chosen
+    sampled.append(points[-1])
+    return sampled
+
+
+def build_series(admission, bucket_seconds=None, max_points=None, start=None, end=None):
+    result = {}
+    for name, points in load_series(admission, start, end).items():
+        if bucket_seconds:
+            points = bucketize(points, bucket_seconds)
+            # для корзин форму сохраняем по среднему значению
+            value_index = 3
+        else:
+            points = [list(point) for point in points]
+            value_index = 1
+        if max_points:
+            points = downsample(points, max_points, value_index)
+        result[name] = points
+    return result